@@ -0,0 +1,271 @@
+# analytics.py
+"""Columnar (Parquet) snapshots of the ward shards and population analytics.
+
+`export_snapshot` copies every table of every ward shard into a snapshot
+directory partitioned by ward (hive style, e.g. patients_data/ward=icu/).
+The analytics functions read those files through pyarrow datasets with
+memory-mapped I/O, only the columns they need, and ward/vital filters pushed
+down to partition and row-group level, so the Streamlit process never holds
+the full table.
+
+Usage:
+    python analytics.py export             # write a new snapshot and prune old ones
+    python analytics.py summary            # print population stats from the latest snapshot
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+
+import patient_db
+import risk
+
+SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "snapshots")
+KEEP_SNAPSHOTS = int(os.getenv("ANALYTICS_KEEP_SNAPSHOTS", "5"))
+CHUNK_ROWS = 50_000
+HYPOXEMIA_THRESHOLD = 95
+
+# ---------------------------
+# Export
+# ---------------------------
+def _shard_tables(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+    return [name for (name,) in rows]
+
+
+def _type_level(decl):
+    decl = (decl or "TEXT").upper()
+    return 0 if "INT" in decl else 1 if decl in ("REAL", "FLOAT", "DOUBLE", "NUMERIC") else 2
+
+
+def _arrow_schema(conns, table):
+    """Arrow schema for `table`, widening types across shards (INTEGER < REAL < TEXT).
+
+    SQLite column types are only affinities: an INTEGER column keeps 72.5 as
+    REAL and "n/a" as TEXT. The vitals (risk.FEATURES) are always float64, so
+    the analytics can compute on them; other columns take the widest of their
+    declared type and the storage classes found in them (one scan per shard).
+    """
+    import pyarrow as pa
+
+    arrow_type = {0: pa.int64(), 1: pa.float64(), 2: pa.string()}
+    columns = {}
+    for conn in conns:
+        declared = {name: decl for _, name, decl, *_ in conn.execute(f"PRAGMA table_info({table})")}
+        names = [name for name in declared if name != "ward"]
+        if not names:
+            continue
+        stored = conn.execute("SELECT " + ", ".join(
+            f"MAX(CASE typeof(\"{name}\") WHEN 'real' THEN 1 WHEN 'text' THEN 2 WHEN 'blob' THEN 2 ELSE 0 END)"
+            for name in names) + f" FROM {table}").fetchone()
+        for name, level in zip(names, stored):
+            level = max(_type_level(declared[name]), level or 0)
+            columns[name] = max(columns.get(name, 0), level)
+    return pa.schema([(name, pa.float64() if name in risk.FEATURES else arrow_type[level])
+                      for name, level in columns.items()])
+
+
+def _to_arrow(chunk, schema):
+    import pandas as pd
+    import pyarrow as pa
+
+    chunk = chunk.drop(columns=["ward"], errors="ignore")
+    for field in schema:
+        if field.name in risk.FEATURES:
+            # a text vital ("n/a") becomes null rather than turning the column into strings
+            chunk[field.name] = pd.to_numeric(chunk[field.name], errors="coerce").astype("float64")
+        elif pa.types.is_string(field.type):
+            # a column with text somewhere may hold numbers elsewhere (e.g. "n/a" among ages)
+            column = chunk[field.name]
+            chunk[field.name] = column.astype(str).where(column.notna(), None)
+    return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def export_snapshot(out_dir=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS):
+    """Write every shard table to a new Parquet snapshot; returns its path."""
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    snapshot_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    tmp_path = os.path.join(out_dir, f".{snapshot_id}.tmp")
+    os.makedirs(tmp_path)
+
+    conns = {ward: patient_db.connect(ward) for ward in patient_db.list_wards()
+             if os.path.exists(patient_db.shard_path(ward))}
+    try:
+        tables = sorted({t for conn in conns.values() for t in _shard_tables(conn)})
+        for table in tables:
+            holders = {w: c for w, c in conns.items() if table in _shard_tables(c)}
+            schema = _arrow_schema(holders.values(), table)
+            for ward, conn in holders.items():
+                part_dir = os.path.join(tmp_path, table, f"ward={ward}")
+                os.makedirs(part_dir)
+                writer = None
+                try:
+                    for chunk in pd.read_sql(f"SELECT * FROM {table}", conn, chunksize=CHUNK_ROWS):
+                        if writer is None:
+                            writer = pq.ParquetWriter(os.path.join(part_dir, "part-0.parquet"), schema)
+                        writer.write_table(_to_arrow(chunk, schema))
+                    if writer is None:
+                        pq.write_table(schema.empty_table(), os.path.join(part_dir, "part-0.parquet"))
+                finally:
+                    if writer is not None:
+                        writer.close()
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    finally:
+        for conn in conns.values():
+            conn.close()
+
+    final_path = os.path.join(out_dir, snapshot_id)
+    os.rename(tmp_path, final_path)
+    with open(os.path.join(out_dir, "LATEST.tmp"), "w") as f:
+        f.write(snapshot_id)
+    os.replace(os.path.join(out_dir, "LATEST.tmp"), os.path.join(out_dir, "LATEST"))
+    prune_snapshots(out_dir, keep)
+    return final_path
+
+
+def list_snapshots(out_dir=SNAPSHOT_DIR):
+    if not os.path.isdir(out_dir):
+        return []
+    return sorted(d for d in os.listdir(out_dir)
+                  if not d.startswith(".") and os.path.isdir(os.path.join(out_dir, d)))
+
+
+def latest_snapshot(out_dir=SNAPSHOT_DIR):
+    """Path of the most recent complete snapshot, or None."""
+    try:
+        with open(os.path.join(out_dir, "LATEST")) as f:
+            return os.path.join(out_dir, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def prune_snapshots(out_dir=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS):
+    for snapshot_id in list_snapshots(out_dir)[:-keep or None]:
+        shutil.rmtree(os.path.join(out_dir, snapshot_id), ignore_errors=True)
+
+# ---------------------------
+# Columnar Reads
+# ---------------------------
+def open_dataset(table="patients_data", snapshot=None):
+    """Memory-mapped, ward-partitioned pyarrow dataset for one table of a snapshot."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    snapshot = snapshot or latest_snapshot()
+    if snapshot is None:
+        raise FileNotFoundError("No analytics snapshot found. Run `python analytics.py export` first.")
+    partitioning = ds.partitioning(pa.schema([("ward", pa.string())]), flavor="hive")
+    return ds.dataset(os.path.join(snapshot, table), format="parquet", partitioning=partitioning,
+                      filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def _ward_filter(ward):
+    import pyarrow.dataset as ds
+    return None if ward is None else ds.field("ward") == patient_db.normalize_ward(ward)
+
+
+def bmi_distribution(ward=None, bins=(0, 18.5, 25, 30, 35, 40, 100), snapshot=None):
+    """Patient counts per BMI band, reading only the bmi column."""
+    import numpy as np
+
+    table = open_dataset(snapshot=snapshot).to_table(columns=["bmi"], filter=_ward_filter(ward))
+    values = table.column("bmi").drop_null().to_numpy()
+    counts, edges = np.histogram(values, bins=bins)
+    labels = [f"{lo:g}–{hi:g}" for lo, hi in zip(edges[:-1], edges[1:])]
+    return dict(zip(labels, counts.tolist()))
+
+
+def hypoxemia_by_ward(threshold=HYPOXEMIA_THRESHOLD, snapshot=None):
+    """Per ward: patients, hypoxemic patients (oxygen below threshold) and their fraction."""
+    import pyarrow.dataset as ds
+
+    dataset = open_dataset(snapshot=snapshot)
+    totals = dataset.to_table(columns=["ward"]).group_by("ward").aggregate([([], "count_all")])
+    # the oxygen predicate is pushed down, so row groups whose statistics rule it out are skipped
+    low = dataset.to_table(columns=["ward"], filter=ds.field("oxygen") < threshold)
+    low = low.group_by("ward").aggregate([([], "count_all")])
+
+    low_counts = dict(zip(low.column("ward").to_pylist(), low.column("count_all").to_pylist()))
+    result = {}
+    for ward, total in zip(totals.column("ward").to_pylist(), totals.column("count_all").to_pylist()):
+        hypoxemic = low_counts.get(ward, 0)
+        result[ward] = {"patients": total, "hypoxemic": hypoxemic,
+                        "fraction": round(hypoxemic / total, 4) if total else 0.0}
+    return result
+
+
+def vitals_summary(ward=None, snapshot=None):
+    """Mean/min/max of each vital, computed column by column with pyarrow.compute."""
+    import pyarrow.compute as pc
+
+    vitals = ["heart_rate", "temperature", "oxygen", "systolic", "diastolic", "bmi"]
+    table = open_dataset(snapshot=snapshot).to_table(columns=vitals, filter=_ward_filter(ward))
+    summary = {}
+    for name in vitals:
+        column = table.column(name)
+        min_max = pc.min_max(column).as_py()
+        summary[name] = {"mean": pc.mean(column).as_py(), "min": min_max["min"], "max": min_max["max"]}
+    return summary
+
+# ---------------------------
+# Analytics Page
+# ---------------------------
+def analytics_page():
+    """Streamlit page with population analytics over the latest snapshot."""
+    import pandas as pd
+    import streamlit as st
+
+    st.title("📊 Population Analytics")
+
+    snapshot = latest_snapshot()
+    col1, col2 = st.columns([3, 1])
+    col1.caption(f"Snapshot: {os.path.basename(snapshot) if snapshot else 'none yet'}")
+    if col2.button("🔄 New Snapshot"):
+        with st.spinner("Exporting patient data to Parquet..."):
+            snapshot = export_snapshot()
+        st.success("✅ Snapshot exported")
+
+    if snapshot is None:
+        st.info("ℹ️ No snapshot yet. Export one to start analysing.")
+        return
+
+    ward = st.selectbox("Ward", ["All wards"] + patient_db.list_wards())
+    ward = None if ward == "All wards" else ward
+
+    st.subheader("⚖️ BMI Distribution")
+    bmi = bmi_distribution(ward, snapshot=snapshot)
+    st.bar_chart(pd.DataFrame({"patients": list(bmi.values())}, index=pd.Index(list(bmi), name="BMI")),
+                 sort=False)
+
+    st.subheader("🫁 Hypoxemia by Ward")
+    st.dataframe(pd.DataFrame.from_dict(hypoxemia_by_ward(snapshot=snapshot), orient="index"))
+
+    st.subheader("📈 Vitals Summary")
+    st.dataframe(pd.DataFrame.from_dict(vitals_summary(ward, snapshot=snapshot), orient="index"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "summary"])
+    parser.add_argument("--ward", help="restrict the summary to one ward")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        print(f"✅ Snapshot written to {export_snapshot()}")
+    else:
+        print(json.dumps({
+            "snapshot": latest_snapshot(),
+            "bmi_distribution": bmi_distribution(args.ward),
+            "hypoxemia_by_ward": hypoxemia_by_ward(),
+            "vitals": vitals_summary(args.ward),
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# baselines.py
+"""Per-patient running baselines of each vital (Welford mean/variance).
+
+Every saved reading updates one compact row per patient and vital in the
+ward's database (count, mean, M2), so a new reading is compared with the
+patient's own history in O(1), without rescanning earlier readings.
+"""
+import datetime
+import math
+
+from risk import FEATURES
+
+Z_THRESHOLD = 3.0    # deviations further than this many standard deviations raise an alert
+MIN_READINGS = 5     # readings needed before a baseline is trusted
+
+# Smallest standard deviation used per vital, so a very stable history does not
+# turn measurement noise into alerts
+MIN_STD = {"heart_rate": 3.0, "temperature": 0.2, "oxygen": 1.0,
+           "systolic": 5.0, "diastolic": 4.0, "bmi": 0.5}
+
+LABELS = {"heart_rate": "Heart Rate", "temperature": "Temperature", "oxygen": "Oxygen",
+          "systolic": "Systolic BP", "diastolic": "Diastolic BP", "bmi": "BMI"}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS patient_baselines (
+        patient_key TEXT NOT NULL,
+        vital TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        updated_at TEXT,
+        PRIMARY KEY (patient_key, vital)
+    ) WITHOUT ROWID
+"""
+
+# ---------------------------
+# Statistics
+# ---------------------------
+def patient_key(patient):
+    """Stable identity for a patient's readings: emergency email if present, else name."""
+    email = str(patient.get("email") or "").strip().lower()
+    return email if email and email != "nan" else str(patient.get("name", "")).strip().lower()
+
+
+def welford_update(stats, value):
+    """Fold one value into (n, mean, m2)."""
+    n, mean, m2 = stats
+    n += 1
+    delta = value - mean
+    mean += delta / n
+    m2 += delta * (value - mean)
+    return n, mean, m2
+
+
+def welford_remove(stats, value):
+    """Take one value back out of (n, mean, m2); inverse of welford_update."""
+    n, mean, m2 = stats
+    if n <= 1:
+        return 0, 0.0, 0.0
+    previous = (n * mean - value) / (n - 1)
+    return n - 1, previous, max(m2 - (value - previous) * (value - mean), 0.0)
+
+
+def excluding(baseline, patient):
+    """`baseline` without the contribution of `patient`, a reading already folded into it.
+
+    A stored reading is judged against the patient's other readings; otherwise
+    an outlier pulls its own baseline towards itself and hides.
+    """
+    result = {}
+    for vital, stats in baseline.items():
+        value = _value(patient, vital)
+        result[vital] = welford_remove(stats, value) if value is not None and stats[0] else stats
+    return result
+
+
+def std(stats, vital):
+    n, _, m2 = stats
+    variance = m2 / (n - 1) if n > 1 else 0.0
+    return max(math.sqrt(variance), MIN_STD.get(vital, 0.0))
+
+
+def deviations(baseline, patient, z_threshold=Z_THRESHOLD, min_readings=MIN_READINGS):
+    """Vitals of `patient` outside the personal baseline: {vital: (value, mean, std, z)}."""
+    found = {}
+    for vital, stats in baseline.items():
+        value = _value(patient, vital)
+        if value is None or stats[0] < min_readings:
+            continue
+        spread = std(stats, vital)
+        z = (value - stats[1]) / spread
+        if abs(z) > z_threshold:
+            found[vital] = (value, stats[1], spread, z)
+    return found
+
+
+def describe(vital, deviation):
+    value, mean, spread, z = deviation
+    direction = "above" if z > 0 else "below"
+    return (f"📈 Unusual {LABELS.get(vital, vital)} for this patient: {value:g} is {abs(z):.1f}σ {direction} "
+            f"their usual {mean:.1f} ± {spread:.1f}")
+
+
+def _value(patient, vital):
+    try:
+        value = float(patient[vital])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+# ---------------------------
+# Storage
+# ---------------------------
+def load(conn, key):
+    """Baseline of one patient: {vital: (n, mean, m2)}."""
+    rows = conn.execute("SELECT vital, n, mean, m2 FROM patient_baselines WHERE patient_key = ?", (key,))
+    return {vital: (n, mean, m2) for vital, n, mean, m2 in rows}
+
+
+def _load_many(conn, keys):
+    baselines = {key: {} for key in keys}
+    keys = list(keys)
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        rows = conn.execute(
+            f"SELECT patient_key, vital, n, mean, m2 FROM patient_baselines "
+            f"WHERE patient_key IN ({', '.join('?' * len(chunk))})", chunk)
+        for key, vital, n, mean, m2 in rows:
+            baselines[key][vital] = (n, mean, m2)
+    return baselines
+
+
+def observe(conn, patients):
+    """Check each new reading against its patient's baseline, then fold it in.
+
+    Readings are processed in order, so several readings of one patient in a
+    batch are each compared with the baseline as it stood before them.
+    Returns a list of (patient name, {vital: deviation}) for readings that deviate.
+    """
+    patients = list(patients)
+    if not patients:
+        return []
+    baselines = _load_many(conn, {patient_key(p) for p in patients})
+    changed = set()
+    alerts = []
+    for patient in patients:
+        key = patient_key(patient)
+        baseline = baselines[key]
+        found = deviations(baseline, patient)
+        if found:
+            alerts.append((patient.get("name"), found))
+        for vital in FEATURES:
+            value = _value(patient, vital)
+            if value is not None:
+                baseline[vital] = welford_update(baseline.get(vital, (0, 0.0, 0.0)), value)
+                changed.add(key)
+
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany(
+        "INSERT OR REPLACE INTO patient_baselines (patient_key, vital, n, mean, m2, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(key, vital, n, mean, m2, now)
+         for key in changed for vital, (n, mean, m2) in baselines[key].items()],
+    )
+    conn.commit()
+    return alerts
+
+
+def rebuild(conn, chunk_rows=1000):
+    """Backfill baselines from the readings already in patients_data (oldest first)."""
+    conn.execute("DELETE FROM patient_baselines")
+    cursor = conn.execute(f"SELECT name, email, {', '.join(FEATURES)} FROM patients_data ORDER BY rowid")
+    columns = [d[0] for d in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        observe(conn, [dict(zip(columns, row)) for row in rows])
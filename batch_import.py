@@ -0,0 +1,230 @@
+# batch_import.py
+"""Batch import of many patient export files (Excel or CSV).
+
+Files are parsed in a process pool, so pandas/openpyxl work runs on every
+core instead of the Streamlit script thread. Parsed frames are handed to a
+single writer thread that drains whatever is ready and bulk-inserts it in
+one go through patient_db.insert_by_ward, so SQLite only ever sees one
+writer. Each file gets a result row with its row count, parse time and
+throughput, or the error that stopped it.
+
+hospital.py runs an ImportJob in the background and polls it; the CLI runs
+one in the foreground.
+
+Usage:
+    python batch_import.py exports/                    # every .xlsx/.xls/.csv in the directory
+    python batch_import.py a.xlsx b.xlsx --ward icu --workers 4
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import patient_db
+
+EXTENSIONS = (".xlsx", ".xls", ".csv")
+MAX_WORKERS = int(os.getenv("BATCH_IMPORT_WORKERS", str(min(8, os.cpu_count() or 1))))
+WRITE_BATCH_ROWS = 50_000   # most rows the writer inserts in one call
+
+
+def start_method():
+    """Start method for the parse pool.
+
+    fork is cheapest, but only safe while this process runs a single thread
+    (the CLI; ImportJob.run forks its workers before starting the writer):
+    forking a threaded server such as Streamlit can leave a worker stuck on a
+    lock another thread held. There forkserver is used instead. Its
+    workers re-import the app script as __mp_main__, so the app must not run
+    its UI under that name (see the router guard in hospital.py).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "fork" in methods and threading.active_count() == 1:
+        return "fork"
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+# ---------------------------
+# Parsing (worker processes)
+# ---------------------------
+def collect_sources(paths):
+    """Expand files and directories into a sorted list of importable file paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(EXTENSIONS) and not name.startswith("~$"):
+                    found.append(os.path.join(path, name))
+        else:
+            found.append(path)
+    return found
+
+
+def parse_source(name, source):
+    """Read one export into patients_data columns. Runs in a worker process.
+
+    `source` is a path or the file's bytes (Streamlit uploads). Returns
+    (frame, seconds, error); on failure frame is None and error is a message.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    try:
+        data = io.BytesIO(source) if isinstance(source, bytes) else source
+        if name.lower().endswith(".csv"):
+            df = pd.read_csv(data)
+        else:
+            df = pd.read_excel(data)
+        missing = [c for c in ("Name", "Weight", "Height") if c not in df.columns]
+        if missing:
+            raise ValueError(f"missing column(s): {', '.join(missing)}")
+        return patient_db.from_sheet(df), time.perf_counter() - start, None
+    except Exception as e:
+        return None, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+# ---------------------------
+# Import Job
+# ---------------------------
+class ImportJob:
+    """Parse `sources` ([(name, path or bytes)]) in a process pool and write them with one writer."""
+
+    def __init__(self, sources, ward=None, workers=MAX_WORKERS):
+        self.sources = list(sources)
+        self.ward = ward
+        self.workers = max(1, min(workers, len(self.sources) or 1))
+        # keyed by position: uploads from different folders can share a file name
+        self.results = [{"file": name, "status": "queued"} for name, _ in self.sources]
+        self.alerts = []
+        self.counts = {}
+        self.started = None
+        self.elapsed = None
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """Run in a background thread; poll `progress()` or wait on `done`."""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        self.started = time.perf_counter()
+        context = multiprocessing.get_context(start_method())
+        if context.get_start_method() == "forkserver":
+            context.set_forkserver_preload(["pandas", "patient_db"])
+        parsed = queue.Queue()
+        writer = threading.Thread(target=self._write_loop, args=(parsed,))
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                # The first submit starts the workers; with fork that must happen before the
+                # writer thread exists, or a worker can inherit a lock (e.g. an import) it holds
+                futures = {pool.submit(parse_source, name, source): i for i, (name, source) in enumerate(self.sources)}
+                writer.start()
+                self._update(list(futures.values()), status="parsing")
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        frame, seconds, error = future.result()
+                    except Exception as e:   # worker crashed (BrokenProcessPool, pickling, ...)
+                        frame, seconds, error = None, 0.0, f"{type(e).__name__}: {e}"
+                    if error:
+                        self._update([i], status="error", error=error, parse_ms=round(seconds * 1000, 1))
+                    else:
+                        self._update([i], status="parsed", rows=len(frame), parse_ms=round(seconds * 1000, 1),
+                                     rows_per_s=round(len(frame) / seconds, 1) if seconds else None)
+                        parsed.put((i, frame))
+        finally:
+            parsed.put(None)
+            if writer.ident is not None:
+                writer.join()
+            self.elapsed = time.perf_counter() - self.started
+            self.done.set()
+
+    def _write_loop(self, parsed):
+        import pandas as pd
+
+        finished = False
+        while not finished:
+            item = parsed.get()
+            if item is None:
+                break
+            batch, rows = [item], len(item[1])
+            # Take whatever else is already parsed, so small files share one insert
+            while rows < WRITE_BATCH_ROWS:
+                try:
+                    item = parsed.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+                rows += len(item[1])
+
+            indices = [i for i, _ in batch]
+            self._update(indices, status="writing")
+            start = time.perf_counter()
+            try:
+                counts, alerts = patient_db.insert_by_ward(
+                    pd.concat([frame for _, frame in batch], ignore_index=True), ward=self.ward)
+            except Exception as e:
+                self._update(indices, status="error", error=f"write failed: {type(e).__name__}: {e}")
+                continue
+            write_ms = round((time.perf_counter() - start) * 1000, 1)
+            with self.lock:
+                self.alerts.extend(alerts)
+                for ward, n in counts.items():
+                    self.counts[ward] = self.counts.get(ward, 0) + n
+            self._update(indices, status="done", write_ms=write_ms, write_batch_files=len(batch))
+
+    def _update(self, indices, **fields):
+        with self.lock:
+            for i in indices:
+                self.results[i].update(fields)
+
+    def progress(self):
+        """Snapshot of the job: per-file results plus totals."""
+        with self.lock:
+            results = [dict(r) for r in self.results]
+            counts = dict(self.counts)
+            alerts = len(self.alerts)
+        elapsed = self.elapsed if self.done.is_set() else (time.perf_counter() - self.started if self.started else 0)
+        rows = sum(r.get("rows", 0) for r in results if r["status"] == "done")
+        return {
+            "files": len(results),
+            "done": sum(r["status"] == "done" for r in results),
+            "errors": sum(r["status"] == "error" for r in results),
+            "finished": self.done.is_set(),
+            "rows_written": rows,
+            "rows_per_s": round(rows / elapsed, 1) if elapsed else None,
+            "elapsed_s": round(elapsed, 2),
+            "wards": counts,
+            "baseline_alerts": alerts,
+            "results": results,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="export files and/or directories of exports")
+    parser.add_argument("--ward", help="ward for rows without a Ward column (default: general)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="parser processes")
+    args = parser.parse_args(argv)
+
+    files = collect_sources(args.paths)
+    if not files:
+        parser.error("no .xlsx/.xls/.csv files found")
+    patient_db.init_all()
+    job = ImportJob([(path, path) for path in files], ward=args.ward, workers=args.workers)
+    job.run()
+    report = job.progress()
+    print(json.dumps(report, indent=2, default=str))
+    raise SystemExit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
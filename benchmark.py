@@ -0,0 +1,279 @@
+# benchmark.py
+"""Benchmark the data, risk, PDF and Slack hot paths of hospital.py.
+
+Runs against a synthetic patient population in a temporary working directory
+(so the real patients.db is never touched) and a local mock Slack server.
+
+Usage:
+    python benchmark.py --patients 1000 --iterations 50 --output bench.json
+    python benchmark.py --compare bench.json   # compare against an earlier run
+"""
+import argparse
+import contextlib
+import datetime
+import importlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ---------------------------
+# Synthetic Patients
+# ---------------------------
+FIRST_NAMES = ["John", "Alice", "Robert", "Emma", "Liam", "Olivia", "Noah", "Ava", "Mia", "Lucas"]
+LAST_NAMES = ["Doe", "Smith", "Brown", "Harris", "Jones", "Miller", "Davis", "Garcia", "Wilson", "Moore"]
+
+
+def make_population(size, seed=42, wards=1):
+    """Build a DataFrame shaped like the Excel uploads accepted by patients_page.
+
+    With more than one ward, rows get a Ward column spread round-robin over the wards.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(size):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append({
+            "Name": f"{first} {last} {i}",
+            "Age": rng.randint(18, 90),
+            "Gender": rng.choice(["Male", "Female", "Other"]),
+            "Weight": round(rng.uniform(45, 120), 1),
+            "Height": round(rng.uniform(150, 200), 1),
+            "Email": f"{first.lower()}.{last.lower()}{i}@example.com",
+            "HeartRate": rng.randint(45, 140),
+            "Temperature": round(rng.uniform(35.0, 39.5), 1),
+            "Oxygen": rng.randint(85, 100),
+            "Systolic": rng.randint(95, 170),
+            "Diastolic": rng.randint(60, 105),
+        })
+        if wards > 1:
+            rows[-1]["Ward"] = f"ward{i % wards}"
+    return pd.DataFrame(rows)
+
+# ---------------------------
+# Mock Slack Server
+# ---------------------------
+class MockSlackHandler(BaseHTTPRequestHandler):
+    """Answers every Slack Web API call with a successful response."""
+
+    uploaded = {}   # file id -> bytes received by the mock upload URL
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        url = urllib.parse.urlsplit(self.path)
+        if url.path.startswith("/upload/"):   # step 2 of files_upload_v2: the raw file bytes
+            self.uploaded[url.path.rsplit("/", 1)[-1]] = len(raw)
+            return self._reply(b"OK - %d" % len(raw), "text/plain")
+        raw = raw.decode()
+        try:
+            params = json.loads(raw) if raw.startswith("{") else dict(urllib.parse.parse_qsl(raw))
+        except ValueError:
+            params = {}
+        params.update(urllib.parse.parse_qsl(url.query))
+        method = url.path.rstrip("/").rsplit("/", 1)[-1]
+        body = {"ok": True, "channel": "C0MOCK", "ts": f"{time.time():.6f}"}
+        if method == "files.getUploadURLExternal":
+            file_id = f"F{uuid.uuid4().hex[:10].upper()}"
+            body.update(file_id=file_id, upload_url=f"http://{self.headers['Host']}/upload/{file_id}")
+        elif method == "files.completeUploadExternal":
+            body["files"] = [{"id": f["id"], "title": f.get("title"), "size": self.uploaded.get(f["id"]),
+                              "permalink": f"https://mock.slack.com/files/{f['id']}"}
+                             for f in json.loads(params.get("files", "[]"))]
+        elif method == "conversations.open":
+            body["channel"] = {"id": f"D{params.get('users', 'U0MOCK')[1:]}"}
+        elif method in ("users.lookupByEmail", "users.info"):
+            user_id = params.get("user") or f"U{zlib.crc32(params.get('email', '').encode()):08X}"
+            body["user"] = {"id": user_id, "profile": {"real_name": "Mock User"}}
+        elif method == "conversations.history":
+            body["messages"] = []
+        self._reply(json.dumps(body).encode())
+
+    def _reply(self, body, content_type="application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockSlackServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_mock_slack():
+    """Start the mock Slack API on a free local port, return (server, base_url)."""
+    server = MockSlackServer(("127.0.0.1", 0), MockSlackHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/"
+
+# ---------------------------
+# Measurement
+# ---------------------------
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(fn, iterations, items_per_call=1):
+    """Time `fn` over `iterations` calls, then one extra call under tracemalloc for peak memory."""
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(samples)
+    return {
+        "iterations": iterations,
+        "total_s": round(total, 6),
+        "throughput_per_s": round(iterations * items_per_call / total, 2) if total else None,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ---------------------------
+# Benchmark Run
+# ---------------------------
+def load_hospital(workdir, slack_url):
+    """Import hospital.py in Streamlit bare mode with its files pointing into `workdir`."""
+    shutil.copy(os.path.join(REPO_DIR, "risk_model.pkl"), workdir)
+    os.environ.update({
+        "SLACK_API_URL": slack_url,
+        "SLACK_BOT_TOKEN2": "xoxb-benchmark",
+        "SLACK_CHANNEL_ID": "C0MOCK",
+        "SLACK_CHANNEL_ID2": "C0MOCK",
+        # absolute, so background flushes after the chdir back stay in the temp dir
+        "DRIFT_MONITOR_DB": os.path.join(workdir, "monitoring.db"),
+        "REPORT_UPLOADS_DB": os.path.join(workdir, "report_uploads.db"),
+    })
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    return importlib.import_module("hospital")
+
+
+def run_benchmarks(patients, iterations, batch, wards=1):
+    server, slack_url = start_mock_slack()
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="l2c-bench-")
+    try:
+        hospital = load_hospital(workdir, slack_url)
+        hospital.save_uploaded_data(make_population(patients, wards=wards))
+
+        results = {}
+        results["get_patients"] = measure(lambda i: hospital.get_patients(), iterations, patients)
+        if wards > 1:
+            results["get_patients_parallel"] = measure(
+                lambda i: hospital.patient_db.read_patients(mode="parallel"), iterations, patients)
+        rows = [row for _, row in hospital.get_patients().iterrows()]
+
+        risk_model = hospital.get_risk_model()  # load once so it is not counted in the first sample
+        results["get_risk_explanations"] = measure(
+            lambda i: hospital.get_risk_explanations(rows[i % len(rows)]), iterations)
+        if risk_model is not None:
+            features = [hospital.risk.feature_frame([r]) for r in rows[:iterations + 1]]
+            results["model_predict"] = measure(
+                lambda i: risk_model.predict(features[i % len(features)]), iterations)
+
+        risks = [hospital.get_risk_explanations(r) for r in rows[:iterations + 1]]
+        results["generate_pdf_report"] = measure(
+            lambda i: hospital.generate_pdf_report(rows[i % len(rows)], risks[i % len(risks)]), iterations)
+        results["send_slack_report"] = measure(
+            lambda i: hospital.send_slack_report(rows[i % len(rows)], risks[i % len(risks)], "benchmark"),
+            iterations)
+
+        uploads = [make_population(batch, seed=i, wards=wards) for i in range(iterations + 1)]
+        results["save_uploaded_data"] = measure(
+            lambda i: hospital.save_uploaded_data(uploads[i]), iterations, batch)
+        return results
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current, baseline):
+    """Print p50/p99 ratios of the current run against a baseline report."""
+    for op, stats in current["results"].items():
+        old = baseline.get("results", {}).get(op)
+        if not old:
+            continue
+        p50 = stats["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("nan")
+        p99 = stats["p99_ms"] / old["p99_ms"] if old["p99_ms"] else float("nan")
+        print(f"{op:24s} p50 x{p50:.2f}  p99 x{p99:.2f}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=1000, help="synthetic population size")
+    parser.add_argument("--iterations", type=int, default=50, help="timed calls per operation")
+    parser.add_argument("--batch", type=int, default=100, help="rows per save_uploaded_data call")
+    parser.add_argument("--wards", type=int, default=1, help="spread patients over this many ward shards")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "patients": args.patients,
+            "iterations": args.iterations,
+            "batch": args.batch,
+            "wards": args.wards,
+        },
+    }
+    # hospital.py prints Slack confirmations; keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report["results"] = run_benchmarks(args.patients, args.iterations, args.batch, args.wards)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# chat_log.py
+"""Durable message log for webapp.py: append-only JSONL segments plus snapshots.
+
+Every message is appended as one JSON line to the active segment. Lines are
+flushed to the OS immediately and fsynced in batches (every FSYNC_BATCH
+records or FSYNC_INTERVAL seconds, whichever comes first), so a burst of
+sends costs one fsync instead of one each. After COMPACT_EVERY records the
+current state is written to a snapshot and a new segment is started; old
+snapshots and the segments they cover are deleted. Startup loads the newest
+snapshot and replays only the segments after it, so recovery reads at most
+one snapshot plus COMPACT_EVERY records however long the history is.
+
+Retention is bounded: each conversation keeps its last MAX_MESSAGES
+messages, and only the newest KEEP_SNAPSHOTS snapshots stay on disk.
+
+Layout (LOG_DIR):
+    snapshot-<seq>.json     state after record <seq>
+    segment-<seq>.jsonl     records from <seq> + 1 onwards
+    .lock                   held by the one process that has the log open
+
+Usage:
+    python chat_log.py stats               # snapshot/segment sizes and counts
+    python chat_log.py compact             # force a snapshot now (refused while webapp.py runs)
+"""
+import argparse
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:   # Windows: no advisory locks, one writer is up to the operator
+    fcntl = None
+
+import metrics
+
+LOG_DIR = os.getenv("CHAT_LOG_DIR", "chat_log")
+LEGACY_HISTORY = "chat_history.json"   # imported once when the log is empty
+FSYNC_BATCH = int(os.getenv("CHAT_LOG_FSYNC_BATCH", "32"))
+FSYNC_INTERVAL = float(os.getenv("CHAT_LOG_FSYNC_INTERVAL", "0.5"))
+COMPACT_EVERY = int(os.getenv("CHAT_LOG_COMPACT_EVERY", "1000"))
+MAX_MESSAGES = int(os.getenv("CHAT_LOG_MAX_MESSAGES", "500"))
+KEEP_SNAPSHOTS = int(os.getenv("CHAT_LOG_KEEP_SNAPSHOTS", "2"))
+
+# ---------------------------
+# Files
+# ---------------------------
+def _seq(path):
+    return int(os.path.basename(path).split("-", 1)[1].split(".", 1)[0])
+
+
+def _files(log_dir, prefix):
+    """Paths of `prefix`-<seq> files, oldest first."""
+    return sorted(glob.glob(os.path.join(log_dir, f"{prefix}-*")), key=_seq)
+
+
+def _fsync_dir(log_dir):
+    try:
+        fd = os.open(log_dir, os.O_RDONLY)
+    except OSError:   # directories cannot be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _lock(log_dir):
+    """Exclusive lock on LOG_DIR/.lock for the life of one ChatLog; RuntimeError if another holds it.
+
+    Two writers (e.g. the app and `python chat_log.py compact`) would each
+    track their own seq and delete segments the other still appends to.
+    """
+    handle = open(os.path.join(log_dir, ".lock"), "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            raise RuntimeError(f"{log_dir} is open in another process (e.g. webapp.py); stop it first")
+    return handle
+
+
+def _write_snapshot(log_dir, seq, state):
+    path = os.path.join(log_dir, f"snapshot-{seq}.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"seq": seq, "chats": state}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(log_dir)
+    return path
+
+
+def _read_snapshot(log_dir):
+    """(seq, state) of the newest readable snapshot; (0, {}) when there is none."""
+    for path in reversed(_files(log_dir, "snapshot")):
+        if path.endswith(".tmp"):
+            continue
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return data["seq"], data["chats"]
+        except (OSError, ValueError, KeyError):
+            continue   # torn or damaged snapshot: fall back to the previous one
+    return 0, {}
+
+
+def _read_records(path, after_seq):
+    """Records in a segment with seq > after_seq, skipping a line torn by a crash."""
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record["seq"] > after_seq:
+                yield record
+
+# ---------------------------
+# Log
+# ---------------------------
+class ChatLog:
+    """Process-wide message log; safe to share between Streamlit sessions."""
+
+    def __init__(self, log_dir=LOG_DIR, fsync_batch=FSYNC_BATCH, fsync_interval=FSYNC_INTERVAL,
+                 compact_every=COMPACT_EVERY, max_messages=MAX_MESSAGES, keep_snapshots=KEEP_SNAPSHOTS):
+        self.log_dir = log_dir
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.max_messages = max_messages
+        self.keep_snapshots = keep_snapshots
+        self.lock = threading.RLock()
+        self.unsynced = 0
+        self.closed = False
+        os.makedirs(log_dir, exist_ok=True)
+        self.lock_file = _lock(log_dir)
+
+        with metrics.timer("chat_log.recover"):
+            self.snapshot_seq, self.chats = _read_snapshot(log_dir)
+            self.seq = self.snapshot_seq
+            for path in _files(log_dir, "segment"):
+                if _seq(path) >= self.snapshot_seq:
+                    for record in _read_records(path, self.seq):
+                        self._apply(record)
+        if not self.seq and os.path.exists(LEGACY_HISTORY):
+            self._import_legacy(LEGACY_HISTORY)
+
+        self.segment = self._open_segment()
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def _open_segment(self):
+        segment = open(os.path.join(self.log_dir, f"segment-{self.seq}.jsonl"), "a+")
+        segment.seek(0, os.SEEK_END)
+        if segment.tell():
+            segment.seek(segment.tell() - 1)
+            if segment.read(1) != "\n":
+                segment.write("\n")   # end a torn line so the next record starts cleanly
+        return segment
+
+    def _apply(self, record):
+        messages = self.chats.setdefault(record["chat"], [])
+        messages.append(record["message"])
+        if len(messages) > self.max_messages:
+            del messages[:-self.max_messages]
+        self.seq = record["seq"]
+
+    def _import_legacy(self, path):
+        try:
+            with open(path) as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            return
+        for chat, messages in legacy.items():
+            for message in messages:
+                self._apply({"seq": self.seq + 1, "chat": chat, "message": message})
+        self.snapshot_seq = self.seq
+        _write_snapshot(self.log_dir, self.seq, self.chats)
+
+    def append(self, chat, message):
+        """Log one message for conversation `chat`; durable within FSYNC_INTERVAL seconds."""
+        with self.lock:
+            record = {"seq": self.seq + 1, "chat": chat, "message": message}
+            self.segment.write(json.dumps(record) + "\n")
+            self.segment.flush()
+            self._apply(record)
+            self.unsynced += 1
+            if self.unsynced >= self.fsync_batch:
+                self._sync()
+            if self.seq - self.snapshot_seq >= self.compact_every:
+                self.compact()
+
+    def append_if_absent(self, chat, message, key):
+        """Append unless `chat` already holds a message with the same `key` value; True if appended.
+
+        Checked under the log's lock, so sessions syncing the same external
+        messages (e.g. Slack ts) log each one once.
+        """
+        with self.lock:
+            if any(m.get(key) == message[key] or m == message for m in self.chats.get(chat, [])):
+                return False
+            self.append(chat, message)
+            return True
+
+    def messages(self, chat):
+        """Copy of one conversation's retained messages."""
+        with self.lock:
+            return list(self.chats.get(chat, []))
+
+    def state(self):
+        """Copy of {chat: [messages]} for a new session."""
+        with self.lock:
+            return {chat: list(messages) for chat, messages in self.chats.items()}
+
+    def _sync(self):
+        if self.unsynced:
+            with metrics.timer("chat_log.fsync"):
+                os.fsync(self.segment.fileno())
+            self.unsynced = 0
+
+    def sync(self):
+        with self.lock:
+            if not self.closed:
+                self._sync()
+
+    def _flush_loop(self):
+        while not self.closed:
+            time.sleep(self.fsync_interval)
+            self.sync()
+
+    def compact(self):
+        """Snapshot the current state, start a new segment and drop what the snapshot covers."""
+        with self.lock, metrics.timer("chat_log.compact"):
+            self._sync()
+            _write_snapshot(self.log_dir, self.seq, self.chats)
+            self.snapshot_seq = self.seq
+            self.segment.close()
+            self.segment = self._open_segment()
+            self._prune()
+
+    def _prune(self):
+        snapshots = [p for p in _files(self.log_dir, "snapshot") if not p.endswith(".tmp")]
+        for path in snapshots[:-self.keep_snapshots]:
+            os.remove(path)
+        oldest_kept = _seq(snapshots[-self.keep_snapshots:][0]) if snapshots else 0
+        for path in _files(self.log_dir, "segment"):
+            # segment-<n> holds records after n, all of which the oldest kept snapshot covers
+            if _seq(path) < oldest_kept:
+                os.remove(path)
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self._sync()
+                self.segment.close()
+                self.lock_file.close()   # releases the flock
+                self.closed = True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "seq": self.seq,
+                "snapshot_seq": self.snapshot_seq,
+                "tail_records": self.seq - self.snapshot_seq,
+                "chats": len(self.chats),
+                "messages": sum(len(m) for m in self.chats.values()),
+                "snapshots": [os.path.basename(p) for p in _files(self.log_dir, "snapshot")],
+                "segments": {os.path.basename(p): os.path.getsize(p) for p in _files(self.log_dir, "segment")},
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["stats", "compact"])
+    args = parser.parse_args(argv)
+
+    try:
+        log = ChatLog()
+    except RuntimeError as e:
+        parser.exit(1, f"❌ {e}\n")
+    if args.command == "compact":
+        log.compact()
+    print(json.dumps(log.stats(), indent=2))
+    log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+# drift_monitor.py
+"""Live prediction log and feature drift scores for the risk model.
+
+Every prediction (its six features and the predicted risk) is written to
+prediction_log, a ring table of RING_SIZE slots in monitoring.db. Alongside
+it, feature_histograms and prediction_counts hold per-bucket counts of
+exactly the rows currently in the ring: a new row increments its buckets,
+and the row it overwrites decrements its own. Drift scores (PSI against the
+training distribution in REFERENCE_PATH) are computed from those few
+hundred counters, so neither logging nor the admin page scans the log.
+
+Predictions are queued in memory and written by a background thread in one
+transaction per batch, so the request path only appends to a list.
+
+Usage:
+    python drift_monitor.py reference      # rebuild the training reference from the retraining reservoir
+    python drift_monitor.py report         # print drift scores
+"""
+import argparse
+import atexit
+import bisect
+import collections
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+import risk
+
+ENABLED = os.getenv("DRIFT_MONITOR_ENABLED", "1").lower() in ("1", "true", "yes")
+MONITOR_DB = os.getenv("DRIFT_MONITOR_DB", "monitoring.db")
+REFERENCE_PATH = os.getenv("DRIFT_REFERENCE_PATH", "risk_model_reference.json")
+RING_SIZE = int(os.getenv("DRIFT_RING_SIZE", "10000"))
+FLUSH_INTERVAL = 1.0
+FLUSH_ROWS = 500
+
+# Bucket edges per feature; values below the first edge or above the last get their own bucket
+EDGES = {
+    "heart_rate": list(range(40, 190, 10)),
+    "temperature": [34 + 0.5 * i for i in range(15)],
+    "oxygen": list(range(80, 101, 2)),
+    "systolic": list(range(80, 210, 10)),
+    "diastolic": list(range(40, 140, 10)),
+    "bmi": list(range(12, 48, 3)),
+}
+
+# Population stability index bands
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS prediction_log (
+        slot INTEGER PRIMARY KEY,
+        seq INTEGER NOT NULL,
+        ts REAL NOT NULL,
+        {', '.join(f'{f} REAL' for f in risk.FEATURES)},
+        prediction TEXT
+    );
+    CREATE TABLE IF NOT EXISTS feature_histograms (
+        feature TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (feature, bucket)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS prediction_counts (
+        prediction TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS monitor_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID;
+"""
+
+# ---------------------------
+# Histograms
+# ---------------------------
+def bucket(feature, value):
+    """Bucket index of `value` (0 = below the first edge); None for a missing value."""
+    if value is None or value != value:
+        return None
+    return bisect.bisect_right(EDGES[feature], value)
+
+
+def bucket_labels(feature):
+    edges = EDGES[feature]
+    return ([f"<{edges[0]:g}"] + [f"{lo:g}–{hi:g}" for lo, hi in zip(edges, edges[1:])]
+            + [f"≥{edges[-1]:g}"])
+
+
+def histogram(values, feature):
+    counts = [0] * (len(EDGES[feature]) + 1)
+    for value in values:
+        b = bucket(feature, value)
+        if b is not None:
+            counts[b] += 1
+    return counts
+
+
+def psi(expected, actual, epsilon=1e-4):
+    """Population stability index between two bucket-count lists (same buckets)."""
+    total_e, total_a = sum(expected), sum(actual)
+    if not total_e or not total_a:
+        return None
+    score = 0.0
+    for e, a in zip(expected, actual):
+        pe, pa = max(e / total_e, epsilon), max(a / total_a, epsilon)
+        score += (pa - pe) * math.log(pa / pe)
+    return score
+
+
+def drift_level(score):
+    if score is None:
+        return "n/a"
+    if score >= PSI_SIGNIFICANT:
+        return "🔴 significant"
+    if score >= PSI_MODERATE:
+        return "🟠 moderate"
+    return "🟢 stable"
+
+# ---------------------------
+# Reference (training) distribution
+# ---------------------------
+def save_reference(rows, labels, path=REFERENCE_PATH):
+    """Store the training distribution: rows are feature lists in risk.FEATURES order."""
+    columns = list(zip(*rows)) if rows else [()] * len(risk.FEATURES)
+    reference = {
+        "rows": len(rows),
+        "edges": EDGES,
+        "features": {f: histogram(columns[i], f) for i, f in enumerate(risk.FEATURES)},
+        "predictions": dict(collections.Counter(labels)),
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(reference, f)
+    os.replace(tmp_path, path)
+    return reference
+
+
+def load_reference(path=REFERENCE_PATH):
+    """Reference histograms, or None if missing or built with different bucket edges."""
+    try:
+        with open(path) as f:
+            reference = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return reference if reference.get("edges") == EDGES else None
+
+# ---------------------------
+# Prediction Log
+# ---------------------------
+def connect(path=MONITOR_DB):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def write_batch(conn, rows, ring_size=RING_SIZE):
+    """Append (ts, [features], prediction) rows to the ring and update the aggregates."""
+    hist_delta = collections.Counter()
+    pred_delta = collections.Counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        found = conn.execute("SELECT value FROM monitor_meta WHERE key = 'seq'").fetchone()
+        seq = found[0] if found else 0
+        for ts, values, prediction in rows:
+            slot = seq % ring_size
+            evicted = conn.execute(
+                f"SELECT {', '.join(risk.FEATURES)}, prediction FROM prediction_log WHERE slot = ?", (slot,)
+            ).fetchone()
+            if evicted:
+                for feature, value in zip(risk.FEATURES, evicted[:-1]):
+                    b = bucket(feature, value)
+                    if b is not None:
+                        hist_delta[(feature, b)] -= 1
+                pred_delta[evicted[-1]] -= 1
+            conn.execute(
+                f"INSERT OR REPLACE INTO prediction_log VALUES ({', '.join('?' * (len(risk.FEATURES) + 4))})",
+                (slot, seq, ts, *values, prediction),
+            )
+            for feature, value in zip(risk.FEATURES, values):
+                b = bucket(feature, value)
+                if b is not None:
+                    hist_delta[(feature, b)] += 1
+            pred_delta[prediction] += 1
+            seq += 1
+
+        conn.executemany(
+            "INSERT INTO feature_histograms (feature, bucket, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (feature, bucket) DO UPDATE SET count = count + excluded.count",
+            [(f, b, n) for (f, b), n in hist_delta.items() if n],
+        )
+        conn.executemany(
+            "INSERT INTO prediction_counts (prediction, count) VALUES (?, ?) "
+            "ON CONFLICT (prediction) DO UPDATE SET count = count + excluded.count",
+            [(str(p), n) for p, n in pred_delta.items() if n],
+        )
+        conn.execute("INSERT OR REPLACE INTO monitor_meta (key, value) VALUES ('seq', ?)", (seq,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class PredictionLogger:
+    """Queues predictions in memory; a background thread writes them in batches."""
+
+    def __init__(self, path=MONITOR_DB, flush_interval=FLUSH_INTERVAL, flush_rows=FLUSH_ROWS):
+        self.path = os.path.abspath(path)   # flushes run later, possibly after a chdir
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.pending = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def log(self, values, prediction):
+        with self.lock:
+            self.pending.append((time.time(), values, None if prediction is None else str(prediction)))
+            if len(self.pending) >= self.flush_rows:
+                self.wake.set()
+
+    def flush(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if rows:
+            conn = connect(self.path)
+            try:
+                with metrics.timer("drift.flush"):
+                    write_batch(conn, rows)
+            finally:
+                conn.close()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass   # monitoring must never break scoring; the rows of this batch are dropped
+
+
+_logger = None
+_logger_lock = threading.Lock()
+_logged_keys = collections.OrderedDict()   # most recent RING_SIZE keys passed to log_predictions
+
+
+def log_predictions(patients, predictions, keys=None):
+    """Record model outputs for the drift monitor (no-op when DRIFT_MONITOR_ENABLED=0).
+
+    With `keys` (one per patient, e.g. ward, row id and model version), a
+    prediction already logged under the same key is skipped, so viewing the
+    same stored reading again does not count it twice.
+    """
+    global _logger
+    if not ENABLED:
+        return
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = PredictionLogger()
+    if keys is not None:
+        with _logger_lock:
+            fresh = [key not in _logged_keys for key in keys]
+            for key in keys:
+                _logged_keys[key] = None
+                _logged_keys.move_to_end(key)
+            while len(_logged_keys) > RING_SIZE:
+                _logged_keys.popitem(last=False)
+        patients = [p for p, new in zip(patients, fresh) if new]
+        predictions = [p for p, new in zip(predictions, fresh) if new]
+    for patient, prediction in zip(patients, predictions):
+        values = []
+        for feature in risk.FEATURES:
+            try:
+                values.append(float(patient[feature]))
+            except (KeyError, TypeError, ValueError):
+                values.append(None)
+        _logger.log(values, prediction)
+
+# ---------------------------
+# Drift Report
+# ---------------------------
+def live_histograms(path=MONITOR_DB):
+    """({feature: bucket counts}, {prediction: count}, rows in the ring) from the aggregate tables."""
+    live = {f: [0] * (len(EDGES[f]) + 1) for f in risk.FEATURES}
+    if not os.path.exists(path):
+        return live, {}, 0
+    conn = connect(path)
+    try:
+        for feature, b, count in conn.execute("SELECT feature, bucket, count FROM feature_histograms"):
+            if feature in live and b < len(live[feature]):
+                live[feature][b] = count
+        predictions = dict(conn.execute("SELECT prediction, count FROM prediction_counts WHERE count > 0"))
+    finally:
+        conn.close()
+    return live, predictions, sum(predictions.values())
+
+
+def drift_report(path=MONITOR_DB, reference_path=REFERENCE_PATH):
+    live, predictions, rows = live_histograms(path)
+    reference = load_reference(reference_path)
+    report = {"window_rows": rows, "ring_size": RING_SIZE, "reference_rows": reference["rows"] if reference else 0,
+              "features": {}, "predictions": {"live": predictions}}
+    for feature in risk.FEATURES:
+        score = psi(reference["features"][feature], live[feature]) if reference else None
+        report["features"][feature] = {"psi": None if score is None else round(score, 4), "level": drift_level(score)}
+    if reference:
+        labels = sorted(set(reference["predictions"]) | set(predictions))
+        score = psi([reference["predictions"].get(l, 0) for l in labels], [predictions.get(l, 0) for l in labels])
+        report["predictions"].update(reference=reference["predictions"],
+                                     psi=None if score is None else round(score, 4), level=drift_level(score))
+    return report
+
+
+def reference_from_reservoir():
+    """Rebuild the reference from the retraining job's training reservoir."""
+    import retrain_risk_model
+
+    _, reservoirs = retrain_risk_model.load_state()
+    train = reservoirs["train"]
+    if not len(train):
+        return None
+    return save_reference(train.X, train.y)
+
+
+def drift_page():
+    """Streamlit admin view of live feature distributions against the training data."""
+    import pandas as pd
+    import streamlit as st
+
+    st.title("🧭 Model Drift")
+    if not ENABLED:
+        st.info("ℹ️ Prediction logging is disabled (DRIFT_MONITOR_ENABLED=0).")
+
+    report = drift_report()
+    live, _, _ = live_histograms()
+    reference = load_reference()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Predictions in window", f"{report['window_rows']} / {report['ring_size']}")
+    col2.metric("Training reference rows", report["reference_rows"])
+    col3.metric("Prediction mix drift", report["predictions"].get("level", "n/a"))
+    if reference is None:
+        st.warning("⚠️ No training reference yet. It is written when retrain_risk_model.py publishes a model, "
+                   "or run `python drift_monitor.py reference`.")
+        if st.button("🧮 Build Reference from Training Reservoir"):
+            if reference_from_reservoir():
+                st.rerun()
+            st.error("❌ The training reservoir is empty.")
+
+    st.subheader("Feature drift (PSI)")
+    st.dataframe(pd.DataFrame.from_dict(report["features"], orient="index"))
+
+    st.subheader("Predicted risk mix")
+    mix = {"live": report["predictions"]["live"]}
+    if reference:
+        mix["training"] = reference["predictions"]
+    st.dataframe(pd.DataFrame(mix).fillna(0))
+
+    feature = st.selectbox("Feature distribution", risk.FEATURES)
+    # numbered labels keep the buckets in value order on the chart axis
+    labels = [f"{i:02d} {label}" for i, label in enumerate(bucket_labels(feature))]
+    shares = {"live": _shares(live[feature])}
+    if reference:
+        shares["training"] = _shares(reference["features"][feature])
+    st.bar_chart(pd.DataFrame(shares, index=pd.Index(labels, name=feature)), stack=False)
+
+
+def _shares(counts):
+    total = sum(counts)
+    return [c / total if total else 0 for c in counts]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["reference", "report"])
+    args = parser.parse_args(argv)
+
+    if args.command == "reference":
+        reference = reference_from_reservoir()
+        print(f"✅ Reference written from {reference['rows']} training rows" if reference
+              else "ℹ️ Training reservoir is empty; run retrain_risk_model.py first")
+    else:
+        print(json.dumps(drift_report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,19 @@
 import streamlit as st
-import pandas as pd
-import sqlite3
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
 import io
 from dotenv import load_dotenv
-import requests
 import os
 import json
-import joblib
+import analytics
+import baselines
+import batch_import
+import drift_monitor
+import metrics
+import patient_db
+import report_pipeline
+import risk
+
+# pandas, reportlab, slack_sdk, requests and joblib/sklearn are imported where
+# they are used, so the login page starts without loading any of them.
 
 # ---------------------------
 # Slack Config
@@ -18,29 +21,47 @@ import joblib
 load_dotenv()
 SLACK_BOT_TOKEN2 = os.getenv("SLACK_BOT_TOKEN2")
 SLACK_CHANNEL_ID2 = os.getenv("SLACK_CHANNEL_ID2")
-slack_client = WebClient(token=os.getenv("SLACK_BOT_TOKEN2"))
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")  # override to point at a local mock
 
+@st.cache_resource
+def get_slack_client():
+    """Create the Slack WebClient on first send."""
+    from slack_sdk import WebClient
+    return WebClient(token=os.getenv("SLACK_BOT_TOKEN2"), base_url=SLACK_API_URL)
 
 # ---------------------------
 # Load Predictive Model
 # ---------------------------
-try:
-    risk_model = joblib.load("risk_model.pkl")
-except:
-    risk_model = None
-    st.warning("⚠️ Predictive risk model not found. Using threshold-based rules.")
+@st.cache_resource(max_entries=2)
+def load_risk_model(version):
+    """Load risk_model.pkl; cached per file version. None if it is missing."""
+    with metrics.timer("model.load"):
+        model = risk.load_model()
+    if model is None:
+        st.warning("⚠️ Predictive risk model not found. Using threshold-based rules.")
+    return model
+
+def get_risk_model():
+    """Current risk model; picks up a model published by retrain_risk_model.py."""
+    return load_risk_model(risk.model_version())
 
 # ---------------------------
 # Slack Reporting
 # ---------------------------
 def send_slack_report(patient, risks, doctor_notes):
+    import requests
+    from slack_sdk.errors import SlackApiError
+
     try:
-        response = slack_client.chat_postMessage(
-            channel=os.getenv("SLACK_CHANNEL_ID"),
-            text=f"*Patient Report*\n👤 Patient: {patient}\n⚠️ Risks: {risks}\n📝 Doctor Notes: {doctor_notes}"
-        )
+        with metrics.timer("slack.chat_postMessage"):
+            response = get_slack_client().chat_postMessage(
+                channel=os.getenv("SLACK_CHANNEL_ID"),
+                text=f"*Patient Report*\n👤 Patient: {patient}\n⚠️ Risks: {risks}\n📝 Doctor Notes: {doctor_notes}"
+            )
         print("✅ Report sent to Slack:", response["ts"])
     except SlackApiError as e:
+        if e.response.status_code == 429:
+            metrics.incr("slack.rate_limited")
         print(f"❌ Slack API Error: {e.response['error']}")
 
     message = f"*📋 Patient Vitals Report: {patient['name']}*\n"
@@ -59,19 +80,46 @@ def send_slack_report(patient, risks, doctor_notes):
     if doctor_notes.strip():
         message += f"\n*💬 Doctor's Notes:*\n{doctor_notes}\n"
 
-    url = "https://slack.com/api/chat.postMessage"
+    url = f"{SLACK_API_URL}chat.postMessage"
     headers = {
         "Authorization": f"Bearer {SLACK_BOT_TOKEN2}",
         "Content-Type": "application/json"
     }
     data = {"channel": SLACK_CHANNEL_ID2, "text": message}
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    with metrics.timer("slack.http_post"):
+        response = requests.post(url, headers=headers, data=json.dumps(data))
+    if response.status_code == 429:
+        metrics.incr("slack.rate_limited")
 
     if response.status_code != 200 or not response.json().get("ok", False):
         st.error(f"⚠️ Slack API Error: {response.text}")
     else:
         st.success("✅ Patient report sent to Slack")
 
+@st.cache_resource
+def get_report_pipeline():
+    """Background PDF uploads, shared by every session."""
+    uploader = report_pipeline.make_uploader(get_slack_client, SLACK_CHANNEL_ID2)
+    return report_pipeline.ReportPipeline(generate_pdf_report, uploader)
+
+def show_report_jobs():
+    """One line per PDF queued by this session; returns True while any is unfinished."""
+    jobs = get_report_pipeline().status(st.session_state.report_jobs)
+    for job in jobs:
+        if job["status"] == "sent":
+            st.caption(f"📎 PDF for {job['patient']} sent" + (" (reused earlier upload)" if job["reused"] else ""))
+        elif job["status"] == "failed":
+            st.caption(f"⚠️ PDF for {job['patient']} failed: {job['error']}")
+        else:
+            st.caption(f"⏳ PDF for {job['patient']}: {job['status']}...")
+    return any(job["status"] not in report_pipeline.FINISHED for job in jobs)
+
+@st.fragment(run_every=1)
+def report_job_status():
+    """Refreshes on its own until every queued PDF has been sent or has failed."""
+    if not show_report_jobs():
+        st.rerun()
+
 # ---------------------------
 # Dummy Users
 # ---------------------------
@@ -91,6 +139,10 @@ if "selected_patient" not in st.session_state:
     st.session_state.selected_patient = None
 if "show_form" not in st.session_state:
     st.session_state.show_form = False
+if "import_job" not in st.session_state:
+    st.session_state.import_job = None
+if "report_jobs" not in st.session_state:
+    st.session_state.report_jobs = []
 
 # ---------------------------
 # CSS
@@ -111,59 +163,28 @@ def load_css():
 # ---------------------------
 # DB Helpers
 # ---------------------------
+@metrics.timed("db.init_db")
 def init_db():
-    conn = sqlite3.connect("patients.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS patients_data (
-            name TEXT,
-            age INTEGER,
-            gender TEXT,
-            weight REAL,
-            height REAL,
-            email TEXT,
-            heart_rate INTEGER,
-            temperature REAL,
-            oxygen INTEGER,
-            systolic INTEGER,
-            diastolic INTEGER,
-            bmi REAL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_uploaded_data(df):
-    df["bmi"] = df.apply(lambda x: round(x["Weight"] / ((x["Height"]/100)**2), 2), axis=1)
-    df = df.rename(columns={
-        "Name": "name", "Age": "age", "Gender": "gender",
-        "Weight": "weight", "Height": "height", "Email": "email",
-        "HeartRate": "heart_rate", "Temperature": "temperature",
-        "Oxygen": "oxygen", "Systolic": "systolic", "Diastolic": "diastolic"
-    })
-    conn = sqlite3.connect("patients.db")
-    df.to_sql("patients_data", conn, if_exists="append", index=False)
-    conn.close()
-
-def save_manual_patient(patient):
-    conn = sqlite3.connect("patients.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO patients_data (name, age, gender, weight, height, email, heart_rate, temperature, oxygen, systolic, diastolic, bmi)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        patient["name"], patient["age"], patient["gender"], patient["weight"], patient["height"], patient["email"],
-        patient["heart_rate"], patient["temperature"], patient["oxygen"], patient["systolic"], patient["diastolic"], patient["bmi"]
-    ))
-    conn.commit()
-    conn.close()
-
-def get_patients():
+    patient_db.init_all()
+
+@metrics.timed("db.save_uploaded_data")
+def save_uploaded_data(df, ward=None):
+    """Store an uploaded sheet; rows with a Ward column are routed to their ward's shard.
+
+    Returns ({ward: rows}, baseline deviation alerts).
+    """
+    return patient_db.insert_by_ward(patient_db.from_sheet(df), ward=ward)
+
+@metrics.timed("db.save_manual_patient")
+def save_manual_patient(patient, ward=None):
+    return patient_db.insert_patient(patient, ward)
+
+@metrics.timed("db.get_patients")
+def get_patients(ward=None):
+    """Patients of one ward, or of every ward when ward is None."""
+    import pandas as pd
     try:
-        conn = sqlite3.connect("patients.db")
-        df = pd.read_sql("SELECT * FROM patients_data", conn)
-        conn.close()
-        return df
+        return patient_db.read_patients(ward)
     except:
         return pd.DataFrame()
 
@@ -171,45 +192,84 @@ def get_patients():
 # Risk Analysis (Predictive + Threshold Fallback)
 # ---------------------------
 def get_risk_explanations(patient):
-    risks = []
+    risk_model = get_risk_model()
+    baseline = patient_db.get_baseline(patient, patient.get("ward"))
+    if baseline and "id" in patient:   # a stored row is already part of its own baseline
+        baseline = baselines.excluding(baseline, patient)
 
     # --- AI Model Prediction ---
+    predicted_risk = None
     if risk_model:
-        features = [[
-            patient['heart_rate'],
-            patient['temperature'],
-            patient['oxygen'],
-            patient['systolic'],
-            patient['diastolic'],
-            patient['bmi']
-        ]]
-        predicted_risk = risk_model.predict(features)[0]
-        risks.append(f"🔮 AI Predicted Risk: {predicted_risk.capitalize()}")
-    
-    # --- Threshold-Based Rules ---
-    if not (60 <= patient['heart_rate'] <= 100):
-        risks.append("⚠️ Abnormal Heart Rate: Possible arrhythmia or stress.")
-    if not (36 <= patient['temperature'] <= 37.5):
-        risks.append("🌡️ Abnormal Temperature: Fever or hypothermia risk.")
-    if not (18.5 <= patient['bmi'] <= 24.9):
-        risks.append("⚖️ Unhealthy BMI: Obesity, diabetes, or malnutrition.")
-    if not (patient['systolic'] < 140 and patient['diastolic'] < 90):
-        risks.append("🩸 High Blood Pressure: Hypertension risk.")
-    if patient['oxygen'] < 95:
-        risks.append("🫁 Low Oxygen Level: Possible hypoxemia.")
-    
-    # If no threshold risk found
-    if len(risks) == (1 if risk_model else 0):  
-        risks.append("✅ All vitals are within healthy ranges (threshold check).")
-
-    return risks
+        with metrics.timer("model.predict"):
+            predicted_risk = risk_model.predict(risk.feature_frame([patient]))[0]
+        # reruns (typing notes, toggles) score the same stored row again; log it once
+        key = (patient.get("ward"), patient["id"], risk.model_version()) if "id" in patient else None
+        drift_monitor.log_predictions([patient], [predicted_risk], keys=None if key is None else [key])
+
+    # --- Threshold-Based Rules + Personal Baseline ---
+    return risk.explain(patient, predicted_risk, baseline)
+
+def show_baseline_alerts(alerts, notify=st.warning):
+    for name, found in alerts:
+        notify(f"{name}: " + "; ".join(baselines.describe(v, d) for v, d in found.items()))
+
+# ---------------------------
+# Batch Import
+# ---------------------------
+def show_import_job(job):
+    progress = job.progress()
+    st.write(f"{progress['done']}/{progress['files']} files imported, {progress['errors']} failed, "
+             f"{progress['rows_written']} rows in {progress['elapsed_s']} s ({progress['rows_per_s']} rows/s)")
+    st.dataframe(progress["results"])
+    return progress
+
+@st.fragment(run_every=1)
+def import_job_progress():
+    """Refreshes on its own while the import runs; the rest of the page stays usable."""
+    job = st.session_state.import_job
+    if job.done.is_set():
+        st.rerun()
+    st.info("⏳ Batch import running...")
+    show_import_job(job)
+
+def batch_import_section(ward):
+    st.subheader("📦 Batch Import (many files)")
+    files = st.file_uploader("Choose export files", type=["xlsx", "xls", "csv"], accept_multiple_files=True,
+                             key="batch_files")
+    folder = st.text_input("...or a folder of exports on the server", value="")
+    job = st.session_state.import_job
+    running = job is not None and not job.done.is_set()
+    if st.button("🚀 Start Batch Import", disabled=running):
+        sources = [(f.name, f.getvalue()) for f in files or []]
+        if folder:
+            sources += [(path, path) for path in batch_import.collect_sources([folder])]
+        if sources:
+            st.session_state.import_job = batch_import.ImportJob(sources, ward=ward).start()
+            st.rerun()
+        else:
+            st.warning("⚠️ Choose files or a folder first.")
+
+    if running:
+        import_job_progress()
+    elif job is not None:
+        progress = show_import_job(job)
+        wards = ", ".join(f"{w}: {n}" for w, n in progress["wards"].items())
+        if progress["errors"]:
+            st.error(f"❌ {progress['errors']} file(s) failed; see the table above.")
+        st.success(f"✅ Batch import finished ({wards or 'no rows'})")
+        show_baseline_alerts(job.alerts)
 
 # ---------------------------
 # PDF Report
 # ---------------------------
+@metrics.timed("pdf.render")
 def generate_pdf_report(patient, risks):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
     buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
+    # invariant: same report, same bytes, so report_pipeline can reuse an earlier upload
+    c = canvas.Canvas(buffer, pagesize=letter, invariant=1)
     c.setFont("Helvetica-Bold", 16)
     c.drawString(50, 750, "Patient Health Report")
     c.setFont("Helvetica", 12)
@@ -255,15 +315,32 @@ def patients_page():
         st.session_state.logged_in = False
         st.session_state.page = "login"
         st.rerun()
+    if st.button("📈 Metrics"):
+        st.session_state.page = "metrics"
+        st.rerun()
+    if st.button("📊 Analytics"):
+        st.session_state.page = "analytics"
+        st.rerun()
+    if st.button("🧭 Model Drift"):
+        st.session_state.page = "drift"
+        st.rerun()
+
+    wards = patient_db.list_wards()
+    ward = st.text_input("🏥 Ward", value=patient_db.DEFAULT_WARD,
+                         help="Uploads and new patients are stored in this ward unless the sheet has a Ward column.")
 
     st.subheader("📂 Upload Patient Data (Excel)")
     uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx", "xls"])
     if uploaded_file is not None:
+        import pandas as pd
         df = pd.read_excel(uploaded_file)
-        save_uploaded_data(df)
-        st.success("✅ Data uploaded successfully!")
+        counts, alerts = save_uploaded_data(df, ward)
+        st.success(f"✅ Data uploaded successfully! ({', '.join(f'{w}: {n}' for w, n in counts.items())})")
+        show_baseline_alerts(alerts)
         st.dataframe(df)
 
+    batch_import_section(ward)
+
     if st.button("➕ Add New Patient"):
         st.session_state.show_form = True
 
@@ -290,12 +367,13 @@ def patients_page():
                     "temperature": temperature, "oxygen": oxygen,
                     "systolic": systolic, "diastolic": diastolic, "bmi": bmi
                 }
-                save_manual_patient(patient)
+                show_baseline_alerts(save_manual_patient(patient, ward), notify=st.toast)
                 st.success(f"✅ Patient {name} added successfully")
                 st.session_state.show_form = False
                 st.rerun()
 
-    df = get_patients()
+    ward_filter = st.selectbox("Show ward", ["All wards"] + wards)
+    df = get_patients(None if ward_filter == "All wards" else ward_filter)
     if not df.empty:
         st.markdown("### Patient List")
         st.dataframe(df)
@@ -330,27 +408,68 @@ def dashboard_page():
     for r in risks:
         st.write(r)
 
+    st.subheader("🏷️ Confirmed Risk")
+    label = st.selectbox("Clinician assessment (used to retrain the model)", risk.RISK_LABELS, index=None,
+                         placeholder="Not assessed")
+    if st.button("💾 Save Assessment", disabled=label is None or "id" not in patient):
+        patient_db.add_label(patient.get("ward"), patient["id"], label)
+        st.success(f"✅ Saved '{label}' for {patient['name']}")
+
     st.subheader("💬 Doctor's Notes")
     doctor_notes = st.text_area("Enter any custom details or observations", height=100)
 
+    attach_pdf = st.checkbox("📎 Attach PDF report", value=True)
     if st.button("📤 Send Report to Slack"):
         send_slack_report(patient, risks, doctor_notes)
-
-    pdf_buffer = generate_pdf_report(patient, risks)
+        if attach_pdf:
+            job_id = get_report_pipeline().submit(patient, risks, f"📋 PDF report for {patient['name']}")
+            st.session_state.report_jobs.append(job_id)
+    if get_report_pipeline().pending(st.session_state.report_jobs):
+        report_job_status()
+    elif st.session_state.report_jobs:
+        show_report_jobs()
+
+    # rendered only when the download is clicked
     st.download_button(
         "📥 Download Report (PDF)",
-        data=pdf_buffer,
+        data=lambda: generate_pdf_report(patient, risks),
         file_name=f"{patient['name']}_report.pdf",
         mime="application/pdf"
     )
 
+def admin_metrics_page():
+    if st.button("⬅️ Back to Patients"):
+        st.session_state.page = "patients"
+        st.rerun()
+    metrics.metrics_page()
+
+def admin_analytics_page():
+    if st.button("⬅️ Back to Patients"):
+        st.session_state.page = "patients"
+        st.rerun()
+    analytics.analytics_page()
+
+def admin_drift_page():
+    if st.button("⬅️ Back to Patients"):
+        st.session_state.page = "patients"
+        st.rerun()
+    drift_monitor.drift_page()
+
 # ---------------------------
 # Main Router
 # ---------------------------
-init_db()
-if st.session_state.page == "login":
-    login_page()
-elif st.session_state.page == "patients":
-    patients_page()
-elif st.session_state.page == "dashboard":
-    dashboard_page()
+# batch_import's worker processes re-import this script as __mp_main__ (forkserver/spawn)
+if __name__ != "__mp_main__":
+    init_db()
+    if st.session_state.page == "login":
+        login_page()
+    elif st.session_state.page == "patients":
+        patients_page()
+    elif st.session_state.page == "dashboard":
+        dashboard_page()
+    elif st.session_state.page == "metrics":
+        admin_metrics_page()
+    elif st.session_state.page == "analytics":
+        admin_analytics_page()
+    elif st.session_state.page == "drift":
+        admin_drift_page()
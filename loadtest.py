@@ -0,0 +1,311 @@
+# loadtest.py
+"""Concurrent-session load test for the Streamlit apps.
+
+Drives N simultaneous headless sessions (streamlit.testing AppTest, one per
+simulated clinician) through the app flow against a seeded temporary
+database and a local mock Slack server. Per step it records latency, and
+while the sessions run it samples process CPU/RSS and probes how long a
+writer waits for the SQLite lock on patients.db. With several --sessions
+levels it reports where throughput stops scaling.
+
+Flows:
+    hospital.py  login -> patient list -> dashboard -> PDF -> Slack report
+    sw1.py       login -> patient list -> dashboard -> PDF -> Slack alert
+    webapp.py    open -> compose -> channel send
+
+AppTest cannot click download buttons, so the PDF step calls the app's
+generate_pdf_report directly.
+
+Usage:
+    python loadtest.py --app hospital.py --sessions 1,2,4,8 --iterations 3
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import benchmark
+
+REPO_DIR = benchmark.REPO_DIR
+USERNAME, PASSWORD = "doctor111", "password123"
+
+# ---------------------------
+# Session Flows
+# ---------------------------
+def _click_prefix(at, prefix, exact=False):
+    for button in at.button:
+        if button.label == prefix or (not exact and button.label.startswith(prefix)):
+            return button.click().run()
+    raise LookupError(f"no {prefix!r} button on page {at.session_state['page'] if 'page' in at.session_state else '?'}")
+
+
+def _click(at, label):
+    return _click_prefix(at, label, exact=True)
+
+
+def _login(at, button):
+    at.text_input[0].input(USERNAME)
+    at.text_input[1].input(PASSWORD)
+    _click(at, button)
+
+
+def hospital_flow(at, step, pdf_module):
+    with step("open"):
+        at.run()
+    with step("login"):
+        _login(at, "🔐 Sign In")
+    with step("patient_list"):
+        at.run()
+    with step("dashboard"):
+        _click_prefix(at, "View ")
+    with step("pdf"):
+        patient = at.session_state.selected_patient
+        pdf_module.generate_pdf_report(patient, pdf_module.get_risk_explanations(patient))
+    with step("slack_send"):
+        _click(at, "📤 Send Report to Slack")
+
+
+def sw1_flow(at, step, pdf_module):
+    with step("open"):
+        at.run()
+    with step("login"):
+        _login(at, "🔐 Sign In with Username")
+    with step("patient_list"):
+        at.run()
+    with step("dashboard"):
+        _click(at, "View Metrics")
+    with step("pdf"):
+        patient = at.session_state.selected_patient
+        pdf_module.generate_pdf_report(patient, pdf_module.get_risk_explanations(patient))
+    with step("slack_send"):
+        _click(at, "🚨 Send Alert to Slack")
+
+
+def webapp_flow(at, step, pdf_module):
+    with step("open"):
+        at.run()
+    with step("compose"):
+        at.text_input[0].input("Load Test")
+        at.text_input[1].input("loadtest@example.com")
+        at.text_area[0].input("Load test message")
+        at.run()
+    with step("slack_send"):
+        _click(at, "Send")
+
+
+FLOWS = {"hospital.py": hospital_flow, "sw1.py": sw1_flow, "webapp.py": webapp_flow}
+
+@contextlib.contextmanager
+def shared_runtime():
+    """Let AppTest sessions run concurrently.
+
+    AppTest installs a mock Runtime singleton for each script run and clears
+    it when the run ends, which breaks any other session still mid-run. While
+    this is active the most recent mock stays visible until every run is done.
+    Script compilation is also serialized, since ast.parse is not thread-safe
+    on every Python version.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    original = Runtime.__dict__["instance"], Runtime.__dict__["exists"]
+    get_bytecode = ScriptCache.get_bytecode
+    compile_lock = threading.Lock()
+    last = []
+
+    def locked_get_bytecode(self, script_path):
+        with compile_lock:
+            return get_bytecode(self, script_path)
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+        if not last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last[0]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(last))
+    ScriptCache.get_bytecode = locked_get_bytecode
+    try:
+        yield
+    finally:
+        Runtime.instance, Runtime.exists = original
+        ScriptCache.get_bytecode = get_bytecode
+
+# ---------------------------
+# Resource Sampling
+# ---------------------------
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Sampler(threading.Thread):
+    """Samples process CPU and RSS, and probes the patients.db write lock."""
+
+    def __init__(self, db_path, interval=0.1):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.cpu, self.rss, self.lock_waits = [], [], []
+
+    def run(self):
+        last_wall, last_cpu = time.perf_counter(), time.process_time()
+        while not self.stopped.wait(self.interval):
+            wall, cpu = time.perf_counter(), time.process_time()
+            self.cpu.append(100 * (cpu - last_cpu) / (wall - last_wall))
+            last_wall, last_cpu = wall, cpu
+            self.rss.append(_rss_mb())
+            self.lock_waits.append(self._probe_lock())
+
+    def _probe_lock(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            start = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            waited = time.perf_counter() - start
+            conn.execute("ROLLBACK")
+            return waited
+        finally:
+            conn.close()
+
+    def summary(self):
+        pct = benchmark.percentile
+        return {
+            "cpu_percent_mean": round(sum(self.cpu) / len(self.cpu), 1) if self.cpu else None,
+            "cpu_percent_max": round(max(self.cpu), 1) if self.cpu else None,
+            "rss_mb_max": round(max(self.rss), 1) if self.rss else None,
+            "db_lock_wait_p50_ms": round(pct(self.lock_waits, 50) * 1000, 3) if self.lock_waits else None,
+            "db_lock_wait_p99_ms": round(pct(self.lock_waits, 99) * 1000, 3) if self.lock_waits else None,
+            "db_lock_wait_max_ms": round(max(self.lock_waits) * 1000, 3) if self.lock_waits else None,
+        }
+
+# ---------------------------
+# Load Run
+# ---------------------------
+def run_level(app, sessions, iterations, pdf_module, timeout):
+    """Run `sessions` concurrent sessions, each doing the flow `iterations` times."""
+    from streamlit.testing.v1 import AppTest
+
+    samples, errors = {}, []
+    lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def step(name):
+        start = time.perf_counter()
+        yield
+        with lock:
+            samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def session():
+        for _ in range(iterations):
+            at = AppTest.from_file(os.path.join(REPO_DIR, app), default_timeout=timeout)
+            try:
+                FLOWS[app](at, step, pdf_module)
+                if at.exception:
+                    raise RuntimeError(at.exception[0].message)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+
+    sampler = Sampler(os.path.abspath("patients.db"))
+    sampler.start()
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    sampler.stopped.set()
+    sampler.join()
+
+    completed = sessions * iterations - len(errors)
+    return {
+        "sessions": sessions,
+        "flows_completed": completed,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "flows_per_s": round(completed / elapsed, 3) if elapsed else None,
+        "steps": {
+            name: {
+                "count": len(values),
+                "p50_ms": round(benchmark.percentile(values, 50) * 1000, 1),
+                "p95_ms": round(benchmark.percentile(values, 95) * 1000, 1),
+                "p99_ms": round(benchmark.percentile(values, 99) * 1000, 1),
+            }
+            for name, values in samples.items()
+        },
+        "server": sampler.summary(),
+    }
+
+
+def saturation_point(levels):
+    """Last session count whose throughput gain over the previous level is at least 10%."""
+    best = levels[0]
+    for previous, current in zip(levels, levels[1:]):
+        if previous["flows_per_s"] and current["flows_per_s"] >= previous["flows_per_s"] * 1.1:
+            best = current
+        else:
+            break
+    return best["sessions"]
+
+
+def run_loadtest(app, session_levels, iterations, patients, timeout):
+    server, slack_url = benchmark.start_mock_slack()
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="l2c-load-")
+    try:
+        os.environ.update({"SLACK_BOT_TOKEN": "xoxb-loadtest", "SLACK_CHANNEL_ID": "C0MOCK"})
+        hospital = benchmark.load_hospital(workdir, slack_url)
+        hospital.save_uploaded_data(benchmark.make_population(patients))
+        pdf_module = importlib.import_module("sw1") if app == "sw1.py" else hospital
+
+        with shared_runtime():
+            run_level(app, 1, 1, pdf_module, timeout)  # warm-up: first run pays for imports and model load
+            levels = [run_level(app, n, iterations, pdf_module, timeout) for n in session_levels]
+        return {"app": app, "patients": patients, "iterations": iterations,
+                "saturation_sessions": saturation_point(levels), "levels": levels}
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=sorted(FLOWS), default="hospital.py")
+    parser.add_argument("--sessions", default="1,2,4,8", help="comma-separated concurrent session counts")
+    parser.add_argument("--iterations", type=int, default=3, help="flows per session")
+    parser.add_argument("--patients", type=int, default=50, help="seeded patient rows")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per script run")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_loadtest(args.app, [int(n) for n in args.sessions.split(",")],
+                              args.iterations, args.patients, args.timeout)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# metrics.py
+"""Lightweight timing and counter hooks shared by the Streamlit apps.
+
+Set METRICS_ENABLED=1 before starting an app to record samples. When disabled,
+`timed` hands back the undecorated function and `timer`/`incr` return
+immediately, so the hooks cost nothing in production.
+"""
+import bisect
+import collections
+import contextlib
+import functools
+import os
+import threading
+import time
+
+ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+BUFFER_SIZE = int(os.getenv("METRICS_BUFFER_SIZE", "10000"))
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# ---------------------------
+# In-process Storage
+# ---------------------------
+_lock = threading.Lock()
+_samples = collections.deque(maxlen=BUFFER_SIZE)   # ring buffer of (unix_ts, op, seconds)
+_histograms = {}                                   # op -> [bucket counts..., +Inf count]
+_sums = collections.Counter()                      # op -> total seconds
+_counters = collections.Counter()                  # event -> count
+_NOOP = contextlib.nullcontext()
+
+
+def record(op, seconds):
+    """Store one latency sample for `op`."""
+    with _lock:
+        _samples.append((time.time(), op, seconds))
+        counts = _histograms.setdefault(op, [0] * (len(BUCKETS) + 1))
+        counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        _sums[op] += seconds
+
+
+def incr(event, amount=1):
+    """Bump a named counter (e.g. slack.rate_limited)."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[event] += amount
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _histograms.clear()
+        _sums.clear()
+        _counters.clear()
+
+# ---------------------------
+# Hooks
+# ---------------------------
+@contextlib.contextmanager
+def _timer(op):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(op, time.perf_counter() - start)
+
+
+def timer(op):
+    """Context manager timing the enclosed block as `op`."""
+    return _timer(op) if ENABLED else _NOOP
+
+
+def timed(op):
+    """Decorator timing every call of the wrapped function as `op`."""
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(op, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+# ---------------------------
+# Reporting
+# ---------------------------
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def summary():
+    """Per-operation latency stats over the samples still in the ring buffer."""
+    with _lock:
+        samples = list(_samples)
+    by_op = collections.defaultdict(list)
+    for _, op, seconds in samples:
+        by_op[op].append(seconds)
+
+    stats = {}
+    for op, values in sorted(by_op.items()):
+        values.sort()
+        stats[op] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50) * 1000, 3),
+            "p99_ms": round(_percentile(values, 99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+    return stats
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def histograms():
+    """Cumulative bucket counts per operation since start (or last reset)."""
+    with _lock:
+        return {op: list(counts) for op, counts in _histograms.items()}
+
+
+def prometheus_text(prefix="l2c"):
+    """Render all histograms and counters in the Prometheus text exposition format."""
+    with _lock:
+        hists = {op: list(counts) for op, counts in _histograms.items()}
+        sums = dict(_sums)
+        events = dict(_counters)
+
+    lines = [
+        f"# HELP {prefix}_operation_seconds Latency of instrumented operations.",
+        f"# TYPE {prefix}_operation_seconds histogram",
+    ]
+    for op in sorted(hists):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), hists[op]):
+            cumulative += count
+            lines.append(f'{prefix}_operation_seconds_bucket{{op="{op}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_operation_seconds_sum{{op="{op}"}} {sums.get(op, 0.0):.6f}')
+        lines.append(f'{prefix}_operation_seconds_count{{op="{op}"}} {cumulative}')
+
+    lines.append(f"# HELP {prefix}_events_total Counted events such as Slack rate-limit hits.")
+    lines.append(f"# TYPE {prefix}_events_total counter")
+    for event in sorted(events):
+        lines.append(f'{prefix}_events_total{{event="{event}"}} {events[event]}')
+    return "\n".join(lines) + "\n"
+
+# ---------------------------
+# Admin Page
+# ---------------------------
+def metrics_page():
+    """Streamlit admin view of latency histograms and counters."""
+    import pandas as pd
+    import streamlit as st
+
+    st.title("📈 Metrics")
+    if not ENABLED:
+        st.info("ℹ️ Metrics are disabled. Start the app with METRICS_ENABLED=1 to record samples.")
+        return
+
+    if st.button("🧹 Reset Metrics"):
+        reset()
+
+    stats = summary()
+    events = counters()
+
+    col1, col2 = st.columns(2)
+    col1.metric("Samples in buffer", f"{sum(s['count'] for s in stats.values())} / {BUFFER_SIZE}")
+    col2.metric("🚦 Slack rate-limit hits", events.get("slack.rate_limited", 0))
+
+    if not stats:
+        st.info("ℹ️ No samples recorded yet.")
+    else:
+        st.subheader("Latency per operation")
+        st.dataframe(pd.DataFrame.from_dict(stats, orient="index"))
+
+        st.subheader("Latency histograms")
+        # numbered labels keep the buckets in latency order on the chart axis
+        bounds = [f"≤{b * 1000:g}ms" for b in BUCKETS] + [f">{BUCKETS[-1] * 1000:g}ms"]
+        labels = [f"{i:02d} {bound}" for i, bound in enumerate(bounds)]
+        for op, counts in sorted(histograms().items()):
+            st.markdown(f"**{op}**")
+            st.bar_chart(pd.DataFrame({"count": counts}, index=pd.Index(labels, name="latency")))
+
+    if events:
+        st.subheader("Counters")
+        st.dataframe(pd.DataFrame.from_dict(events, orient="index", columns=["count"]))
+
+    text = prometheus_text()
+    st.download_button("📥 Download Prometheus Metrics", data=text, file_name="metrics.prom", mime="text/plain")
+    with st.expander("Prometheus text export"):
+        st.code(text, language="text")
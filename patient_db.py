@@ -0,0 +1,298 @@
+# patient_db.py
+"""Ward-sharded patient storage.
+
+Every ward gets its own SQLite file, so wards write in parallel instead of
+queueing on a single writer lock. The default ward keeps using patients.db,
+which means existing data stays where it is. Cross-ward reads either ATTACH
+the shard files to one connection or fan out over a thread pool.
+"""
+import datetime
+import glob
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import baselines
+from risk import FEATURES, RISK_LABELS
+
+DEFAULT_DB = "patients.db"
+DEFAULT_WARD = "general"
+SHARD_DIR = os.getenv("PATIENT_SHARD_DIR", "wards")
+MAX_WORKERS = int(os.getenv("PATIENT_SHARD_WORKERS", "8"))
+SQLITE_MAX_ATTACHED = 10  # compile-time default of SQLite
+
+COLUMNS = [
+    "name", "age", "gender", "weight", "height", "email",
+    "heart_rate", "temperature", "oxygen", "systolic", "diastolic", "bmi",
+]
+
+# Column names of the Excel/device exports -> patients_data columns
+SHEET_COLUMNS = {
+    "Name": "name", "Age": "age", "Gender": "gender",
+    "Weight": "weight", "Height": "height", "Email": "email",
+    "HeartRate": "heart_rate", "Temperature": "temperature",
+    "Oxygen": "oxygen", "Systolic": "systolic", "Diastolic": "diastolic",
+    "Ward": "ward", "Risk": "risk",
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS patients_data (
+        name TEXT,
+        age INTEGER,
+        gender TEXT,
+        weight REAL,
+        height REAL,
+        email TEXT,
+        heart_rate INTEGER,
+        temperature REAL,
+        oxygen INTEGER,
+        systolic INTEGER,
+        diastolic INTEGER,
+        bmi REAL
+    )
+"""
+
+# Clinician-confirmed risk labels, the training data of retrain_risk_model.py.
+# The AUTOINCREMENT id only grows, so it doubles as the retraining watermark.
+LABELS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS risk_labels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_rowid INTEGER NOT NULL,
+        label TEXT NOT NULL,
+        labeled_at TEXT
+    )
+"""
+
+# ---------------------------
+# Routing
+# ---------------------------
+def normalize_ward(ward):
+    """Map a free-text ward name to the key used for its shard file."""
+    if ward is None or ward != ward or str(ward).strip() == "":   # ward != ward: NaN from a blank cell
+        return DEFAULT_WARD
+    return re.sub(r"[^a-z0-9_-]+", "_", str(ward).strip().lower())
+
+
+def shard_path(ward=None):
+    """Database file holding the given ward's patients."""
+    ward = normalize_ward(ward)
+    if ward == DEFAULT_WARD:
+        return DEFAULT_DB
+    return os.path.join(SHARD_DIR, f"patients_{ward}.db")
+
+
+def list_wards():
+    """Default ward first, then every ward that has a shard file."""
+    wards = [DEFAULT_WARD]
+    for path in sorted(glob.glob(os.path.join(SHARD_DIR, "patients_*.db"))):
+        ward = os.path.basename(path)[len("patients_"):-len(".db")]
+        if ward not in wards:
+            wards.append(ward)
+    return wards
+
+
+def connect(ward=None):
+    return sqlite3.connect(shard_path(ward), timeout=30)
+
+# ---------------------------
+# Writes
+# ---------------------------
+def init_shard(ward=None):
+    path = shard_path(ward)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute(SCHEMA)
+    conn.execute(LABELS_SCHEMA)
+    fresh = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'patient_baselines'").fetchone() is None
+    conn.execute(baselines.SCHEMA)
+    if fresh:
+        baselines.rebuild(conn)
+    conn.commit()
+    conn.close()
+
+
+def init_all():
+    for ward in list_wards():
+        init_shard(ward)
+
+
+def from_sheet(df):
+    """Rename export columns to patients_data names and add BMI from weight and height."""
+    df = df.assign(bmi=(df["Weight"] / (df["Height"] / 100) ** 2).round(2))
+    return df.rename(columns=SHEET_COLUMNS)
+
+
+def insert_frame(df, ward=None):
+    """Append rows (already using the patients_data column names) to one ward.
+
+    Returns the baseline deviation alerts raised by the new readings.
+    """
+    init_shard(ward)
+    conn = connect(ward)
+    try:
+        labels = df["risk"] if "risk" in df.columns else None
+        df = df[[c for c in COLUMNS if c in df.columns]]
+        conn.execute("BEGIN IMMEDIATE")   # keeps the new rowids contiguous for the labels below
+        first_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM patients_data").fetchone()[0]
+        df.to_sql("patients_data", conn, if_exists="append", index=False)
+        if labels is not None:
+            _insert_labels(conn, [(first_rowid + i, label) for i, label in enumerate(labels)])
+        return baselines.observe(conn, df.to_dict("records"))
+    finally:
+        conn.close()
+
+
+def insert_by_ward(df, ward_column="ward", ward=None):
+    """Split rows on `ward_column` and write each ward's shard concurrently.
+
+    Rows without a ward column or with a blank ward go to `ward`.
+    Returns ({ward: row_count}, alerts).
+    """
+    if ward_column not in df.columns:
+        return {normalize_ward(ward): len(df)}, insert_frame(df, ward)
+
+    keys = df[ward_column].where(df[ward_column].notna(), ward).map(normalize_ward)
+    groups = {key: part for key, part in df.groupby(keys, sort=False)}
+    if len(groups) == 1:
+        key, part = next(iter(groups.items()))
+        alerts = insert_frame(part, key)
+    else:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(groups))) as pool:
+            alerts = [a for found in pool.map(lambda item: insert_frame(item[1], item[0]), groups.items())
+                      for a in found]
+    return {key: len(part) for key, part in groups.items()}, alerts
+
+
+def insert_patient(patient, ward=None):
+    """Insert one reading; returns its baseline deviation alerts."""
+    init_shard(ward)
+    conn = connect(ward)
+    try:
+        conn.execute(
+            f"INSERT INTO patients_data ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [patient[c] for c in COLUMNS],
+        )
+        return baselines.observe(conn, [patient])
+    finally:
+        conn.close()
+
+
+def _insert_labels(conn, pairs):
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany(
+        "INSERT INTO risk_labels (patient_rowid, label, labeled_at) VALUES (?, ?, ?)",
+        [(int(rowid), str(label).strip().lower(), now) for rowid, label in pairs
+         if label == label and str(label).strip().lower() in RISK_LABELS],
+    )
+    conn.commit()
+
+
+def add_label(ward, patient_id, label):
+    """Record a clinician's risk label for one patients_data row."""
+    init_shard(ward)
+    conn = connect(ward)
+    try:
+        _insert_labels(conn, [(patient_id, label)])
+    finally:
+        conn.close()
+
+
+def get_baseline(patient, ward=None):
+    """Running baseline of the patient's vitals in their ward: {vital: (n, mean, m2)}."""
+    if not os.path.exists(shard_path(ward)):
+        return {}
+    conn = connect(ward)
+    try:
+        return baselines.load(conn, baselines.patient_key(patient))
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+# ---------------------------
+# Reads
+# ---------------------------
+def read_ward(ward=None, where="", params=()):
+    """patients_data rows of a single ward, with a `ward` column added."""
+    import pandas as pd
+
+    ward = normalize_ward(ward)
+    if not os.path.exists(shard_path(ward)):
+        return pd.DataFrame(columns=["id"] + COLUMNS + ["ward"])
+    conn = connect(ward)
+    try:
+        df = pd.read_sql(f"SELECT rowid AS id, * FROM patients_data {where}", conn, params=params)
+    finally:
+        conn.close()
+    df["ward"] = ward
+    return df
+
+
+def read_parallel(wards=None, where="", params=()):
+    """Query every ward's shard on a thread pool and concatenate the results."""
+    import pandas as pd
+
+    wards = wards or list_wards()
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(wards))) as pool:
+        frames = list(pool.map(lambda w: read_ward(w, where, params), wards))
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_attached(wards=None, where="", params=()):
+    """Query all shards through one connection with ATTACH and UNION ALL.
+
+    Shards are attached in groups of SQLITE_MAX_ATTACHED; `params` are
+    repeated for every shard in the union.
+    """
+    import pandas as pd
+
+    wards = [w for w in (wards or list_wards()) if os.path.exists(shard_path(w))]
+    frames = []
+    for start in range(0, len(wards), SQLITE_MAX_ATTACHED):
+        group = wards[start:start + SQLITE_MAX_ATTACHED]
+        conn = sqlite3.connect(":memory:")
+        try:
+            selects = []
+            for i, ward in enumerate(group):
+                conn.execute(f"ATTACH DATABASE ? AS shard{i}", (shard_path(ward),))
+                selects.append(f"SELECT rowid AS id, *, '{ward}' AS ward FROM shard{i}.patients_data {where}")
+            frames.append(pd.read_sql(" UNION ALL ".join(selects), conn, params=tuple(params) * len(group)))
+        finally:
+            conn.close()
+    if not frames:
+        return pd.DataFrame(columns=["id"] + COLUMNS + ["ward"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_patients(ward=None, where="", params=(), mode="attach"):
+    """Rows of one ward, or of all wards when `ward` is None.
+
+    `mode` picks the cross-ward strategy: "attach" (one connection, measured
+    faster in-process since the pandas work stays on one thread) or "parallel".
+    """
+    if ward is not None:
+        return read_ward(ward, where, params)
+    if mode == "parallel":
+        return read_parallel(where=where, params=params)
+    return read_attached(where=where, params=params)
+
+
+def read_labels(ward, after_id=0, chunk_rows=5000):
+    """Yield (label_id, [feature values], label) for labels newer than `after_id`, oldest first."""
+    if not os.path.exists(shard_path(ward)):
+        return
+    conn = connect(ward)
+    try:
+        cursor = conn.execute(
+            f"SELECT l.id, {', '.join('p.' + f for f in FEATURES)}, l.label FROM risk_labels l "
+            f"JOIN patients_data p ON p.rowid = l.patient_rowid WHERE l.id > ? ORDER BY l.id", (after_id,))
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0], list(row[1:-1]), row[-1]
+    finally:
+        conn.close()
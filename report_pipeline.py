@@ -0,0 +1,210 @@
+# report_pipeline.py
+"""Background delivery of PDF patient reports to Slack.
+
+`ReportPipeline.submit` queues a report and returns at once. A bounded pool
+of workers renders the PDF off the Streamlit script thread and uploads it
+with Slack's external file upload (files_upload_v2). Uploads are remembered
+by destination and the SHA-256 of the PDF bytes, so sending an unchanged
+report to the same channel again just posts the link of the file already
+there. Reports are rendered with
+reportlab's invariant mode, which keeps the bytes of an unchanged report
+identical.
+
+For local runs, set REPORT_UPLOAD_DIR to write the PDFs to a folder instead
+of Slack, or point SLACK_API_URL at the mock server in benchmark.py.
+"""
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import slack_broadcast
+
+MAX_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+UPLOADS_DB = os.getenv("REPORT_UPLOADS_DB", "report_uploads.db")
+UPLOAD_DIR = os.getenv("REPORT_UPLOAD_DIR", "")
+MAX_JOBS = 200   # finished jobs kept for status display
+FINISHED = ("sent", "failed")
+
+# ---------------------------
+# Upload Cache
+# ---------------------------
+class UploadCache:
+    """(uploader namespace, sha256 of a PDF) -> the file it was uploaded as.
+
+    The namespace is the Slack channel, or "local:<dir>" for LocalUploader,
+    so a file uploaded to one channel or to the local stub is never shared as
+    if it were in another.
+    """
+
+    def __init__(self, path=UPLOADS_DB):
+        self.path = os.path.abspath(path)   # workers use it later, possibly after a chdir
+        conn = self._connect()
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(uploaded_reports)")]
+            if columns and "namespace" not in columns:
+                # Older cache keyed by hash alone: its rows do not say where the file went
+                conn.execute("DROP TABLE uploaded_reports")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS uploaded_reports (
+                    namespace TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    permalink TEXT,
+                    filename TEXT,
+                    uploaded_at TEXT,
+                    PRIMARY KEY (namespace, sha256)
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, namespace, digest):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT file_id, permalink FROM uploaded_reports WHERE namespace = ? AND sha256 = ?",
+                               (namespace, digest)).fetchone()
+        finally:
+            conn.close()
+        return row
+
+    def put(self, namespace, digest, file_id, permalink, filename):
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO uploaded_reports VALUES (?, ?, ?, ?, ?, ?)",
+                         (namespace, digest, file_id, permalink, filename,
+                          datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            conn.commit()
+        finally:
+            conn.close()
+
+# ---------------------------
+# Uploaders
+# ---------------------------
+class SlackUploader:
+    def __init__(self, client, channel):
+        self.client = slack_broadcast.with_rate_limit_retries(client)
+        self.channel = channel
+        self.namespace = channel   # UploadCache key: files are only reshared in the channel they were uploaded to
+
+    def upload(self, pdf, filename, title, comment):
+        """Upload a new file to the channel; returns (file_id, permalink)."""
+        with metrics.timer("slack.files_upload_v2"):
+            response = self.client.files_upload_v2(channel=self.channel, content=pdf, filename=filename,
+                                                   title=title, initial_comment=comment)
+        file = response.get("file") or {}
+        return file.get("id"), file.get("permalink")
+
+    def share(self, file_id, permalink, comment):
+        """Post an already-uploaded file again, by link."""
+        slack_broadcast._call(self.client, "chat_postMessage", channel=self.channel, text=f"{comment}\n{permalink}")
+
+
+class LocalUploader:
+    """Stand-in for Slack: writes PDFs and messages to a folder."""
+
+    def __init__(self, directory=UPLOAD_DIR):
+        self.directory = directory
+        self.namespace = f"local:{os.path.abspath(directory)}"
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, pdf, filename, title, comment):
+        digest = hashlib.sha256(pdf).hexdigest()
+        path = os.path.abspath(os.path.join(self.directory, f"{digest[:16]}-{filename}"))
+        with open(path, "wb") as f:
+            f.write(pdf)
+        self.share(digest[:16], f"file://{path}", comment)
+        return digest[:16], f"file://{path}"
+
+    def share(self, file_id, permalink, comment):
+        with open(os.path.join(self.directory, "messages.jsonl"), "a") as f:
+            f.write(json.dumps({"file_id": file_id, "permalink": permalink, "text": comment}) + "\n")
+
+
+def make_uploader(get_client, channel):
+    """LocalUploader when REPORT_UPLOAD_DIR is set, else Slack through the client from `get_client()`."""
+    if UPLOAD_DIR:
+        return LocalUploader(UPLOAD_DIR)
+    return SlackUploader(get_client(), channel)
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+class ReportPipeline:
+    """Queue of report deliveries; at most `max_workers` render or upload at once."""
+
+    def __init__(self, render, uploader, cache=None, max_workers=MAX_WORKERS):
+        self.render = render          # (patient, risks) -> BytesIO with the PDF
+        self.uploader = uploader
+        self.cache = cache or UploadCache()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._hash_locks = {}
+
+    def submit(self, patient, risks, comment):
+        """Queue one report; returns its job id (see `status`)."""
+        patient = dict(patient)
+        job = {"id": next(self._ids), "patient": str(patient.get("name")), "status": "queued",
+               "reused": False, "error": None}
+        with self.lock:
+            self.jobs[job["id"]] = job
+            for old in list(self.jobs)[:-MAX_JOBS]:
+                if self.jobs[old]["status"] in FINISHED:
+                    del self.jobs[old]
+        metrics.incr("report.queued")
+        self.pool.submit(self._deliver, job, patient, list(risks), comment)
+        return job["id"]
+
+    def status(self, job_ids):
+        with self.lock:
+            return [dict(self.jobs[i]) for i in job_ids if i in self.jobs]
+
+    def pending(self, job_ids):
+        return any(job["status"] not in FINISHED for job in self.status(job_ids))
+
+    def _set(self, job, **fields):
+        with self.lock:
+            job.update(fields)
+
+    def _hash_lock(self, key):
+        with self.lock:
+            return self._hash_locks.setdefault(key, threading.Lock())
+
+    def _deliver(self, job, patient, risks, comment):
+        try:
+            self._set(job, status="rendering")
+            pdf = self.render(patient, risks).getvalue()
+            digest = hashlib.sha256(pdf).hexdigest()
+            filename = f"{patient.get('name', 'patient')}_report.pdf"
+
+            # One delivery per destination and hash at a time, so identical reports in flight upload once
+            namespace = self.uploader.namespace
+            with self._hash_lock((namespace, digest)):
+                cached = self.cache.get(namespace, digest)
+                if cached:
+                    self._set(job, status="sharing", reused=True)
+                    self.uploader.share(cached[0], cached[1], comment)
+                    metrics.incr("report.reused_upload")
+                else:
+                    self._set(job, status="uploading")
+                    file_id, permalink = self.uploader.upload(pdf, filename, f"Patient Report: {patient.get('name')}",
+                                                              comment)
+                    self.cache.put(namespace, digest, file_id, permalink, filename)
+            self._set(job, status="sent", sha256=digest[:12])
+        except Exception as e:
+            response = getattr(e, "response", None)   # SlackApiError carries the API response
+            if getattr(response, "status_code", None) == 429:
+                metrics.incr("slack.rate_limited")
+            metrics.incr("report.failed")
+            self._set(job, status="failed", error=response["error"] if response is not None else str(e))
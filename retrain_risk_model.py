@@ -0,0 +1,202 @@
+# retrain_risk_model.py
+"""Incremental retraining of risk_model.pkl from clinician-labelled readings.
+
+Labels live in each ward shard's risk_labels table (dashboard label button,
+or a Risk column in an uploaded sheet). Every run:
+
+1. reads only the labels after each ward's watermark (last label id used),
+2. folds them into two fixed-size reservoir samples (Algorithm R): one for
+   training and, for a stable 20% of labels, one for validation,
+3. trains a fresh RandomForest on the training reservoir,
+4. scores it and the currently published model on the validation reservoir
+   and publishes it only if the macro F1 improves.
+
+Reservoirs and watermarks are kept next to the model, so a run costs
+O(new labels + reservoir size) no matter how much history has accumulated.
+train_risk_model.py still builds the initial model.
+
+Usage:
+    python retrain_risk_model.py                 # incremental run
+    python retrain_risk_model.py --dry-run       # evaluate only, publish nothing
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import zlib
+
+import drift_monitor
+import patient_db
+import risk
+
+STATE_PATH = os.getenv("RISK_RETRAIN_STATE", "risk_model_state.json")
+RESERVOIR_PATH = os.getenv("RISK_RESERVOIR_PATH", "risk_reservoir.pkl")
+TRAIN_RESERVOIR = int(os.getenv("RISK_TRAIN_RESERVOIR", "20000"))
+VALIDATION_RESERVOIR = int(os.getenv("RISK_VALIDATION_RESERVOIR", "5000"))
+VALIDATION_PERCENT = 20
+MIN_VALIDATION = 30          # labels needed before any model is compared
+MIN_IMPROVEMENT = 0.0        # candidate must beat the published model by more than this
+N_ESTIMATORS = 100
+HISTORY = 20                 # runs kept in the state file
+
+# ---------------------------
+# Reservoir Sampling
+# ---------------------------
+class Reservoir:
+    """Uniform sample of at most `capacity` (features, label) pairs from a stream."""
+
+    def __init__(self, capacity, seed=42):
+        self.capacity = capacity
+        self.X, self.y = [], []
+        self.seen = 0
+        self.rng = random.Random(seed)
+
+    def add(self, features, label):
+        self.seen += 1
+        if len(self.X) < self.capacity:
+            self.X.append(features)
+            self.y.append(label)
+            return
+        slot = self.rng.randrange(self.seen)
+        if slot < self.capacity:
+            self.X[slot], self.y[slot] = features, label
+
+    def __len__(self):
+        return len(self.X)
+
+    def dump(self):
+        """Plain-data form for the reservoir file (no pickled classes)."""
+        return {"capacity": self.capacity, "X": self.X, "y": self.y, "seen": self.seen,
+                "rng": self.rng.getstate()}
+
+    @classmethod
+    def restore(cls, data):
+        reservoir = cls(data["capacity"])
+        reservoir.X, reservoir.y, reservoir.seen = data["X"], data["y"], data["seen"]
+        reservoir.rng.setstate(data["rng"])
+        return reservoir
+
+
+def is_validation(ward, label_id):
+    """Stable split: the same label always lands on the same side."""
+    return zlib.crc32(f"{ward}:{label_id}".encode()) % 100 < VALIDATION_PERCENT
+
+
+def load_state(state_path=STATE_PATH, reservoir_path=RESERVOIR_PATH):
+    import joblib
+
+    state = {"watermarks": {}, "published_score": None, "history": []}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state.update(json.load(f))
+    if os.path.exists(reservoir_path):
+        reservoirs = {name: Reservoir.restore(data) for name, data in joblib.load(reservoir_path).items()}
+    else:
+        reservoirs = {"train": Reservoir(TRAIN_RESERVOIR), "validation": Reservoir(VALIDATION_RESERVOIR, seed=7)}
+    return state, reservoirs
+
+
+def _atomic_dump(obj, path):
+    import joblib
+
+    tmp_path = path + ".tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_state(state, reservoirs, state_path=STATE_PATH, reservoir_path=RESERVOIR_PATH):
+    # Reservoirs first: a crash between the two re-reads some labels rather than losing them
+    _atomic_dump({name: r.dump() for name, r in reservoirs.items()}, reservoir_path)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+# ---------------------------
+# Training
+# ---------------------------
+def ingest(state, reservoirs):
+    """Fold labels past each ward's watermark into the reservoirs; returns {ward: new labels}."""
+    patient_db.init_all()
+    new = {}
+    for ward in patient_db.list_wards():
+        watermark = state["watermarks"].get(ward, 0)
+        count = 0
+        for label_id, features, label in patient_db.read_labels(ward, watermark):
+            target = "validation" if is_validation(ward, label_id) else "train"
+            reservoirs[target].add(features, label)
+            watermark = label_id
+            count += 1
+        state["watermarks"][ward] = watermark
+        if count:
+            new[ward] = count
+    return new
+
+
+def score(model, reservoir):
+    from sklearn.metrics import f1_score
+
+    predicted = model.predict(risk.feature_frame([dict(zip(risk.FEATURES, x)) for x in reservoir.X]))
+    return f1_score(reservoir.y, predicted, average="macro")
+
+
+def train(reservoir):
+    from sklearn.ensemble import RandomForestClassifier
+
+    model = RandomForestClassifier(n_estimators=N_ESTIMATORS, random_state=42, n_jobs=-1)
+    model.fit(risk.feature_frame([dict(zip(risk.FEATURES, x)) for x in reservoir.X]), reservoir.y)
+    return model
+
+
+def retrain(model_path=risk.MODEL_PATH, state_path=STATE_PATH, reservoir_path=RESERVOIR_PATH, dry_run=False):
+    """One incremental run; returns a report dict (also appended to the state history)."""
+    state, reservoirs = load_state(state_path, reservoir_path)
+    new = ingest(state, reservoirs)
+    train_set, validation = reservoirs["train"], reservoirs["validation"]
+    report = {
+        "at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "new_labels": new,
+        "train_size": len(train_set),
+        "validation_size": len(validation),
+        "published": False,
+    }
+
+    if not new:
+        report["reason"] = "no new labels"
+    elif len(validation) < MIN_VALIDATION or len(set(train_set.y)) < 2:
+        report["reason"] = f"not enough labels yet (need {MIN_VALIDATION} validation rows and 2 classes)"
+    else:
+        candidate = train(train_set)
+        current = risk.load_model(model_path)
+        report["candidate_f1"] = round(score(candidate, validation), 4)
+        report["current_f1"] = round(score(current, validation), 4) if current is not None else None
+        if report["current_f1"] is not None and report["candidate_f1"] <= report["current_f1"] + MIN_IMPROVEMENT:
+            report["reason"] = "candidate did not beat the published model"
+        elif dry_run:
+            report["reason"] = "dry run"
+        else:
+            _atomic_dump(candidate, model_path)
+            drift_monitor.save_reference(train_set.X, train_set.y)
+            state["published_score"] = report["candidate_f1"]
+            report["published"] = True
+
+    if not dry_run:
+        state["history"] = (state["history"] + [report])[-HISTORY:]
+        save_state(state, reservoirs, state_path, reservoir_path)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=risk.MODEL_PATH, help="model file to compare against and publish to")
+    parser.add_argument("--dry-run", action="store_true", help="train and compare, but publish and record nothing")
+    args = parser.parse_args(argv)
+
+    report = retrain(args.model, dry_run=args.dry_run)
+    print(json.dumps(report, indent=2))
+    print("✅ Published new risk model" if report["published"] else f"ℹ️ Model unchanged: {report['reason']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# risk.py
+"""Risk rules and model helpers shared by hospital.py and the scoring service."""
+import os
+
+MODEL_PATH = os.getenv("RISK_MODEL_PATH", "risk_model.pkl")
+
+# Feature order the model in risk_model.pkl was trained with (see train_risk_model.py)
+FEATURES = ["heart_rate", "temperature", "oxygen", "systolic", "diastolic", "bmi"]
+
+RISK_LABELS = ("low", "medium", "high")
+
+ALL_CLEAR = "✅ All vitals are within healthy ranges (threshold check)."
+
+
+def load_model(path=MODEL_PATH):
+    """Unpickle the risk model; None if the file is missing or unreadable."""
+    try:
+        import joblib
+        return joblib.load(path)
+    except Exception:
+        return None
+
+
+def model_version(path=MODEL_PATH):
+    """Modification time of the model file (changes when a retrain publishes); None if missing."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def feature_frame(patients):
+    """DataFrame of model features, one row per patient (dict or Series)."""
+    import pandas as pd
+    return pd.DataFrame([[p[f] for f in FEATURES] for p in patients], columns=FEATURES)
+
+
+def prediction_message(predicted_risk):
+    return f"🔮 AI Predicted Risk: {str(predicted_risk).capitalize()}"
+
+
+# (vitals the rule looks at, check that passes when healthy, message when it fails)
+THRESHOLD_RULES = [
+    (("heart_rate",), lambda p: 60 <= p['heart_rate'] <= 100,
+     "⚠️ Abnormal Heart Rate: Possible arrhythmia or stress."),
+    (("temperature",), lambda p: 36 <= p['temperature'] <= 37.5,
+     "🌡️ Abnormal Temperature: Fever or hypothermia risk."),
+    (("bmi",), lambda p: 18.5 <= p['bmi'] <= 24.9,
+     "⚖️ Unhealthy BMI: Obesity, diabetes, or malnutrition."),
+    (("systolic", "diastolic"), lambda p: p['systolic'] < 140 and p['diastolic'] < 90,
+     "🩸 High Blood Pressure: Hypertension risk."),
+    (("oxygen",), lambda p: p['oxygen'] >= 95,
+     "🫁 Low Oxygen Level: Possible hypoxemia."),
+]
+
+
+def threshold_risks(patient, baseline=None):
+    """Fixed-range vital checks; empty list when everything is in range.
+
+    With a personal `baseline` (see baselines.py), a failed check whose vitals
+    are all within the patient's usual range is marked as such. The baseline
+    must not include `patient` itself (see baselines.excluding).
+    """
+    import baselines
+
+    usual = set()
+    if baseline:
+        unusual = baselines.deviations(baseline, patient)
+        usual = {v for v, stats in baseline.items() if stats[0] >= baselines.MIN_READINGS and v not in unusual}
+
+    risks = []
+    for vitals, check, message in THRESHOLD_RULES:
+        if not check(patient):
+            risks.append(f"{message} (usual for this patient)" if usual.issuperset(vitals) else message)
+    return risks
+
+
+def explain(patient, predicted_risk=None, baseline=None):
+    """Full risk explanation list as shown on the dashboard."""
+    import baselines
+
+    risks = [prediction_message(predicted_risk)] if predicted_risk is not None else []
+    risks.extend(threshold_risks(patient, baseline) or [ALL_CLEAR])
+    if baseline:
+        risks.extend(baselines.describe(v, d) for v, d in baselines.deviations(baseline, patient).items())
+    return risks
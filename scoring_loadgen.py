@@ -0,0 +1,122 @@
+# scoring_loadgen.py
+"""Load generator for scoring_service.py.
+
+Fires single-patient /score requests from many concurrent clients and reports
+requests/sec and tail latency. With --sweep it starts an in-process service
+for each max_batch:max_wait_ms setting, so batch settings can be compared
+side by side.
+
+Usage:
+    python scoring_loadgen.py --url http://127.0.0.1:8600 --concurrency 32 --requests 200
+    python scoring_loadgen.py --sweep 1:0,8:2,32:5,64:10 --concurrency 64
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.request
+
+import risk
+import scoring_service
+
+
+def random_patient(rng):
+    return {
+        "heart_rate": rng.randint(45, 140),
+        "temperature": round(rng.uniform(35.0, 39.5), 1),
+        "oxygen": rng.randint(85, 100),
+        "systolic": rng.randint(95, 170),
+        "diastolic": rng.randint(60, 105),
+        "bmi": round(rng.uniform(16, 40), 1),
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def run_load(url, concurrency, requests_per_client, seed=42):
+    """Drive `concurrency` clients sending `requests_per_client` requests each."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(seed + index)
+        local, failed = [], 0
+        for _ in range(requests_per_client):
+            body = json.dumps(random_patient(rng)).encode()
+            request = urllib.request.Request(f"{url}/score", data=body, headers={"Content-Type": "application/json"})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                local.append(time.perf_counter() - start)
+            except OSError:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "requests_per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def sweep(settings, concurrency, requests_per_client, model_path):
+    """Run the load against a fresh in-process service per (max_batch, max_wait_ms)."""
+    model = risk.load_model(model_path)
+    results = []
+    for max_batch, max_wait_ms in settings:
+        server, batcher = scoring_service.make_server(port=0, model=model,
+                                                      max_batch=max_batch, max_wait_ms=max_wait_ms)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            result = run_load(f"http://127.0.0.1:{server.server_port}", concurrency, requests_per_client)
+        finally:
+            server.shutdown()
+            server.server_close()
+            batcher.close()
+        result.update({
+            "max_batch": max_batch,
+            "max_wait_ms": max_wait_ms,
+            "mean_batch_size": round(batcher.batched_patients / batcher.batches, 2) if batcher.batches else 0,
+        })
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8600", help="running scoring service")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--sweep", help="comma-separated max_batch:max_wait_ms settings to compare in-process")
+    parser.add_argument("--model", default=risk.MODEL_PATH, help="model used by --sweep")
+    args = parser.parse_args(argv)
+
+    if args.sweep:
+        settings = [(int(b), float(w)) for b, w in (item.split(":") for item in args.sweep.split(","))]
+        report = sweep(settings, args.concurrency, args.requests, args.model)
+    else:
+        report = run_load(args.url, args.concurrency, args.requests)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# scoring_service.py
+"""Headless HTTP risk-scoring service with dynamic micro-batching.
+
+Concurrent requests are queued and gathered into micro-batches: a batch is
+closed when it reaches --max-batch patients or when the oldest request has
+waited --max-wait-ms, then scored with one vectorized `predict` call. The
+threshold rules are the same ones the dashboard uses (risk.py).
+
+Endpoints:
+    POST /score     {"heart_rate": 72, ...} or {"patients": [{...}, ...]}
+    GET  /health
+    GET  /metrics   Prometheus text (set METRICS_ENABLED=1)
+
+Usage:
+    python scoring_service.py --port 8600 --max-batch 32 --max-wait-ms 5
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import drift_monitor
+import metrics
+import risk
+
+# ---------------------------
+# Micro-batching
+# ---------------------------
+class MicroBatcher:
+    """Collects single-patient requests from many threads into batched predict calls."""
+
+    def __init__(self, model, max_batch=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.batched_patients = 0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, patient):
+        """Queue one patient; the returned Future resolves to its predicted risk (or None)."""
+        future = Future()
+        self._queue.put((patient, future))
+        return future
+
+    def close(self):
+        self._stopped.set()
+        self._worker.join()
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            patients = [patient for patient, _ in batch]
+            if self.model is None:
+                results = [(None, None)] * len(batch)
+            else:
+                try:
+                    with metrics.timer("scoring.predict_batch"):
+                        results = [(p, None) for p in self.model.predict(risk.feature_frame(patients)).tolist()]
+                except Exception:
+                    # One bad row must not fail the other requests in its batch
+                    metrics.incr("scoring.batch_fallbacks")
+                    results = [self._predict_one(patient) for patient in patients]
+            self.batches += 1
+            self.batched_patients += len(batch)
+            metrics.incr("scoring.batches")
+            metrics.incr("scoring.batched_patients", len(batch))
+            for (_, future), (prediction, error) in zip(batch, results):
+                if error is None:
+                    future.set_result(prediction)
+                else:
+                    future.set_exception(error)
+            if self.model is not None:
+                scored = [(patient, prediction) for patient, (prediction, error) in zip(patients, results) if error is None]
+                drift_monitor.log_predictions([p for p, _ in scored], [r for _, r in scored])
+
+    def _predict_one(self, patient):
+        try:
+            return self.model.predict(risk.feature_frame([patient])).tolist()[0], None
+        except Exception as e:
+            return None, e
+
+# ---------------------------
+# HTTP Service
+# ---------------------------
+def score_patients(batcher, patients, timeout=10):
+    """Score a list of patients through the batcher; returns one result dict per patient."""
+    for patient in patients:
+        missing = [f for f in risk.FEATURES if f not in patient]
+        if missing:
+            raise ValueError(f"missing features: {', '.join(missing)}")
+        invalid = [f for f in risk.FEATURES if isinstance(patient[f], bool) or not isinstance(patient[f], (int, float))]
+        if invalid:
+            raise ValueError(f"non-numeric features: {', '.join(invalid)}")
+    futures = [batcher.submit(patient) for patient in patients]
+    results = []
+    for patient, future in zip(patients, futures):
+        predicted = future.result(timeout=timeout)
+        results.append({"predicted_risk": predicted, "risks": risk.explain(patient, predicted)})
+    return results
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def _reply(self, status, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"ok": True, "model_loaded": self.batcher.model is not None})
+        elif self.path == "/metrics":
+            self._reply(200, metrics.prometheus_text(), "text/plain; version=0.0.4")
+        else:
+            self._reply(404, {"ok": False, "error": "not_found"})
+
+    def do_POST(self):
+        if self.path != "/score":
+            self._reply(404, {"ok": False, "error": "not_found"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            patients = payload["patients"] if "patients" in payload else [payload]
+            with metrics.timer("scoring.request"):
+                results = score_patients(self.batcher, patients)
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"ok": False, "error": str(e)})
+            return
+        except FutureTimeoutError:   # not the builtin TimeoutError before Python 3.11
+            self._reply(503, {"ok": False, "error": "scoring_timeout"})
+            return
+        self._reply(200, {"ok": True, "results": results})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # gateways open many connections at once
+
+
+def make_server(host="127.0.0.1", port=8600, model=None, max_batch=32, max_wait_ms=5.0):
+    """Build (server, batcher); call server.serve_forever() to start answering requests."""
+    handler = type("BoundScoringHandler", (ScoringHandler,),
+                   {"batcher": MicroBatcher(model, max_batch, max_wait_ms)})
+    return ScoringServer((host, port), handler), handler.batcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--model", default=risk.MODEL_PATH, help="pickled risk model")
+    parser.add_argument("--max-batch", type=int, default=32, help="largest micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="longest a request waits for its batch to fill")
+    args = parser.parse_args(argv)
+
+    model = risk.load_model(args.model)
+    if model is None:
+        print(f"⚠️ Could not load {args.model}; serving threshold rules only.")
+    server, batcher = make_server(args.host, args.port, model, args.max_batch, args.max_wait_ms)
+    print(f"✅ Scoring service on http://{args.host}:{server.server_port} "
+          f"(max batch {args.max_batch}, max wait {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# slack_broadcast.py
+"""Concurrent Slack DMs to many users, with cached user lookups and tier rate limits.
+
+A DM normally costs three calls (users.lookupByEmail, conversations.open,
+chat.postMessage). The first two results are cached per email, so repeat
+recipients only cost a post. Sends fan out over a bounded thread pool, and
+each Web API method is paced by a token bucket sized to its Slack rate-limit
+tier. Any 429 that still happens is retried after Retry-After by
+slack_sdk's RateLimitErrorRetryHandler.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+MAX_WORKERS = int(os.getenv("SLACK_BROADCAST_WORKERS", "8"))
+CACHE_TTL = int(os.getenv("SLACK_USER_CACHE_TTL", "3600"))
+
+# Requests per minute per method (Tier 3 for lookups/opens)
+TIER_LIMITS = {
+    "users_lookupByEmail": 50,
+    "conversations_open": 50,
+}
+# chat.postMessage is limited by Slack to about one message per second per channel
+POST_PER_CHANNEL_PER_MINUTE = 60
+
+# ---------------------------
+# Rate Limiting
+# ---------------------------
+class TokenBucket:
+    """Allows `per_minute` calls per minute, with bursts up to `burst` (default: per_minute)."""
+
+    def __init__(self, per_minute, burst=None):
+        self.capacity = float(burst or per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {method: TokenBucket(limit) for method, limit in TIER_LIMITS.items()}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(method, channel=None):
+    if method != "chat_postMessage":
+        return _buckets[method]
+    with _buckets_lock:
+        key = (method, channel)
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(POST_PER_CHANNEL_PER_MINUTE, burst=1)
+        return _buckets[key]
+
+
+def _call(client, method, **kwargs):
+    _bucket(method, kwargs.get("channel")).acquire()
+    with metrics.timer(f"slack.{method}"):
+        return getattr(client, method)(**kwargs)
+
+# ---------------------------
+# Lookup Cache
+# ---------------------------
+class RecipientCache:
+    """email -> (user_id, dm_channel_id), shared by all sessions of the app process."""
+
+    def __init__(self, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, email):
+        with self._lock:
+            entry = self._entries.get(email)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    def put(self, email, value):
+        with self._lock:
+            self._entries[email] = (time.monotonic(), value)
+
+    def forget(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+
+recipient_cache = RecipientCache()
+
+
+def with_rate_limit_retries(client, max_retry_count=2):
+    """Let `client` sleep for Retry-After and retry when Slack answers 429."""
+    from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
+
+    if not any(isinstance(h, RateLimitErrorRetryHandler) for h in client.retry_handlers):
+        client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=max_retry_count))
+    return client
+
+
+def resolve(client, email):
+    """DM channel for an email address, via the cache when possible."""
+    cached = recipient_cache.get(email)
+    if cached:
+        return cached
+    user_id = _call(client, "users_lookupByEmail", email=email)["user"]["id"]
+    channel_id = _call(client, "conversations_open", users=user_id)["channel"]["id"]
+    recipient_cache.put(email, (user_id, channel_id))
+    return user_id, channel_id
+
+# ---------------------------
+# Sending
+# ---------------------------
+def send_dm(client, email, text):
+    """Send one DM; returns a delivery result dict (never raises for Slack or network errors)."""
+    from slack_sdk.errors import SlackApiError
+
+    result = {"email": email, "ok": False, "info": "", "ts": None}
+    try:
+        _, channel_id = resolve(client, email)
+        response = _call(client, "chat_postMessage", channel=channel_id, text=text)
+        result.update(ok=True, info="ok", ts=response.get("ts"))
+    except SlackApiError as e:
+        if e.response.status_code == 429:
+            metrics.incr("slack.rate_limited")
+        if e.response.get("error") in ("channel_not_found", "user_not_found", "not_in_channel"):
+            recipient_cache.forget(email)
+        result["info"] = e.response.get("error", str(e))
+    except Exception as e:   # transport errors (URLError, timeouts, ...) fail this recipient only
+        metrics.incr("slack.transport_errors")
+        result["info"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def broadcast(client, emails, text, max_workers=MAX_WORKERS):
+    """Send `text` as a DM to every address in `emails` concurrently.
+
+    Duplicate addresses are sent once. Returns one result dict per unique
+    address, in input order.
+    """
+    unique = list(dict.fromkeys(e.strip().lower() for e in emails if e and e.strip()))
+    if not unique:
+        return []
+    with_rate_limit_retries(client)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as pool:
+        return list(pool.map(lambda email: send_dm(client, email, text), unique))
+
+
+def parse_recipients(text):
+    """Split a pasted list of emails (commas, semicolons, spaces or new lines)."""
+    for sep in ",;\n\t":
+        text = text.replace(sep, " ")
+    return [part for part in text.split(" ") if part]
@@ -0,0 +1,106 @@
+# startup_benchmark.py
+"""Cold-start benchmark for hospital.py based on `python -X importtime`.
+
+Starts the app in Streamlit bare mode (which renders the login page) in a
+temporary directory, sums the import time reported by the interpreter and
+fails if it exceeds the target or if a dependency that should load lazily
+shows up on the login path.
+
+Usage:
+    python startup_benchmark.py                      # check against the default target
+    python startup_benchmark.py --max-import-ms 800 --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cold-start import budget for the login page, in milliseconds
+DEFAULT_MAX_IMPORT_MS = 1000
+
+# Heavy dependencies that must only load when their feature is used
+LAZY_MODULES = ("pandas", "reportlab", "slack_sdk", "requests", "joblib", "sklearn")
+
+# ---------------------------
+# Measurement
+# ---------------------------
+def parse_importtime(stderr):
+    """Return {module: (self_us, cumulative_us, depth)} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def run_once(script, workdir):
+    """Start `script` once under -X importtime and return (wall_ms, modules)."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.join(REPO_DIR, script)],
+        cwd=workdir, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script} exited with {proc.returncode}:\n{proc.stderr[-2000:]}")
+    return wall_ms, parse_importtime(proc.stderr)
+
+
+def benchmark(script, runs):
+    workdir = tempfile.mkdtemp(prefix="l2c-startup-")
+    try:
+        shutil.copy(os.path.join(REPO_DIR, "risk_model.pkl"), workdir)
+        walls, imports, modules = [], [], {}
+        for _ in range(runs):
+            wall_ms, modules = run_once(script, workdir)
+            walls.append(wall_ms)
+            imports.append(sum(cum for _, cum, depth in modules.values() if depth == 0) / 1000)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    top_level = sorted(((cum, name) for name, (_, cum, depth) in modules.items() if depth == 0), reverse=True)
+    return {
+        "script": script,
+        "runs": runs,
+        "import_ms": round(statistics.median(imports), 1),
+        "wall_ms": round(statistics.median(walls), 1),
+        "heaviest_imports_ms": {name: round(cum / 1000, 1) for cum, name in top_level[:10]},
+        "eager_heavy_modules": sorted(m for m in LAZY_MODULES if m in modules),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", default="hospital.py", help="app script to start")
+    parser.add_argument("--runs", type=int, default=3, help="cold starts to take the median of")
+    parser.add_argument("--max-import-ms", type=float, default=DEFAULT_MAX_IMPORT_MS, help="import time budget")
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.script, args.runs)
+    report["max_import_ms"] = args.max_import_ms
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if report["import_ms"] > args.max_import_ms:
+        failures.append(f"import time {report['import_ms']} ms exceeds {args.max_import_ms} ms")
+    if report["eager_heavy_modules"]:
+        failures.append(f"loaded at startup: {', '.join(report['eager_heavy_modules'])}")
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print("✅ Cold start within budget", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,13 @@ import sqlite3
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 import io
+import functools
+import html
 from dotenv import load_dotenv
 import requests   # ✅ Added for Slack API
 import os
+import metrics
+import patient_db
 
 # ---------------------------
 # Slack Config
@@ -14,6 +18,7 @@ import os
 load_dotenv()
 SLACK_BOT_TOKEN2 = os.getenv("SLACK_BOT_TOKEN2")   # put in .env
 SLACK_CHANNEL_ID2 = os.getenv("SLACK_CHANNEL_ID2") # put in .env
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")  # override to point at a local mock
 
 def send_slack_alert(patient, risks):
     """Send alert to Slack if risks are found."""
@@ -30,11 +35,14 @@ def send_slack_alert(patient, risks):
     message = f"*🚨 Patient Alert: {patient['name']}* \n"
     message += "\n".join([f"- {r}" for r in real_risks])
 
-    url = "https://slack.com/api/chat.postMessage"
+    url = f"{SLACK_API_URL.rstrip('/')}/chat.postMessage"
     headers = {"Authorization": f"Bearer {SLACK_BOT_TOKEN2}"}
     data = {"channel": SLACK_CHANNEL_ID2, "text": message}
 
-    response = requests.post(url, headers=headers, data=data)
+    with metrics.timer("slack.http_post"):
+        response = requests.post(url, headers=headers, data=data)
+    if response.status_code == 429:
+        metrics.incr("slack.rate_limited")
 
     if response.status_code != 200 or not response.json().get("ok", False):
         st.error(f"⚠️ Slack API Error: {response.text}")
@@ -62,88 +70,104 @@ if "show_form" not in st.session_state:
     st.session_state.show_form = False   # ✅ for manual patient form
 
 # ---------------------------
-# Load CSS for styling
+# Dashboard Cards
 # ---------------------------
-def load_css():
-    st.markdown(
-        """
-        <style>
-        .block-container { max-width: 1100px; padding-top: 2rem; }
-        h1, h2, h3 { font-family: 'Segoe UI', sans-serif; }
-        .card {
-            background-color: white; border-radius: 16px;
-            padding: 20px; box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-            margin-bottom: 20px; text-align: center;
-        }
-        .metric-value { font-size: 26px; font-weight: bold; margin-top: 10px; }
-        .status { font-size: 14px; margin-top: 6px; padding: 4px 10px;
-                  border-radius: 12px; display: inline-block; }
-        .normal { background: #d4f8d4; color: #2e7d32; }
-        .good { background: #d0f0ff; color: #0277bd; }
-        .low { background: #ffe0e0; color: #c62828; }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+# Built once per process and sent in the same markdown call as the cards, so a
+# rerun emits one element instead of a style block plus six cards
+DASHBOARD_CSS = """
+<style>
+.block-container { max-width: 1100px; padding-top: 2rem; }
+h1, h2, h3 { font-family: 'Segoe UI', sans-serif; }
+.card-grid { display: grid; grid-template-columns: repeat(3, 1fr); gap: 0 20px; }
+.wall .card-grid { grid-template-columns: repeat(6, 1fr); }
+.wall .block-title { margin: 10px 0 6px; }
+.card {
+    background-color: white; border-radius: 16px;
+    padding: 20px; box-shadow: 0 4px 12px rgba(0,0,0,0.1);
+    margin-bottom: 20px; text-align: center;
+}
+.metric-value { font-size: 26px; font-weight: bold; margin-top: 10px; }
+.status { font-size: 14px; margin-top: 6px; padding: 4px 10px;
+          border-radius: 12px; display: inline-block; }
+.normal { background: #d4f8d4; color: #2e7d32; }
+.good { background: #d0f0ff; color: #0277bd; }
+.low { background: #ffe0e0; color: #c62828; }
+</style>
+"""
+
+CARD_FIELDS = ("name", "email", "age", "gender", "weight", "height",
+               "heart_rate", "temperature", "oxygen", "systolic", "diastolic", "bmi")
+
+# (title, value, healthy check, (class, label) when healthy, label when not)
+VITAL_CARDS = [
+    ("❤️ Heart Rate", lambda p: f"{p['heart_rate']} BPM",
+     lambda p: 60 <= p['heart_rate'] <= 100, ("normal", "Normal"), "Alert"),
+    ("🌡️ Temperature", lambda p: f"{p['temperature']}°C",
+     lambda p: 36 <= p['temperature'] <= 37.5, ("good", "Good"), "Alert"),
+    ("BMI", lambda p: f"{round(p['bmi'], 2)}",
+     lambda p: 18.5 <= p['bmi'] <= 24.9, ("normal", "Normal"), "Alert"),
+    ("🩸 Blood Pressure", lambda p: f"{p['systolic']}/{p['diastolic']}",
+     lambda p: p['systolic'] < 140 and p['diastolic'] < 90, ("normal", "Normal"), "Alert"),
+    ("Oxygen Level", lambda p: f"{p['oxygen']}%",
+     lambda p: p['oxygen'] >= 95, ("normal", "Normal"), "Low"),
+]
+
+
+def patient_version(patient):
+    """Row version for the card cache: the values the cards display."""
+    return tuple(patient[f] for f in CARD_FIELDS)
+
+
+def _escape(value):
+    """Uploaded sheets are free text; every value in the card markup goes through here."""
+    return html.escape(str(value))
+
+
+def _vital_card(p, title, value, check, healthy, alert_label):
+    css_class, label = healthy if check(p) else ("low", alert_label)
+    return (f'<div class="card"><h4>{title}</h4><div class="metric-value">{_escape(value(p))}</div>'
+            f'<div class="status {css_class}">{label}</div></div>')
+
+
+@functools.lru_cache(maxsize=2048)
+def render_cards(patient_id, version):
+    """The six dashboard cards of one patient row as HTML, cached per (id, version)."""
+    p = dict(zip(CARD_FIELDS, version))
+    e = {field: _escape(value) for field, value in p.items()}
+    info = (f'<div class="card"><h4>👤 Patient Info</h4><p>{e["name"]}</p>'
+            f'<p>Emergency: {e["email"]}</p>'
+            f'<p>Age: {e["age"]} | Gender: {e["gender"]}</p>'
+            f'<p>Weight: {e["weight"]} | Height: {e["height"]}</p></div>')
+    vitals = [_vital_card(p, *spec) for spec in VITAL_CARDS]
+    # Same order as the original two rows: heart rate, info, temperature / BMI, BP, oxygen
+    return f'<div class="card-grid">{vitals[0]}{info}{"".join(vitals[1:])}</div>'
+
+
+def patient_cards(patient):
+    return render_cards(patient.get("id"), patient_version(patient))
 
 # ---------------------------
 # Database Helper Functions
 # ---------------------------
+@metrics.timed("db.init_db")
 def init_db():
-    conn = sqlite3.connect("patients.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS patients_data (
-            name TEXT, age INTEGER, gender TEXT,
-            weight REAL, height REAL, email TEXT,
-            heart_rate INTEGER, temperature REAL,
-            oxygen INTEGER, systolic INTEGER,
-            diastolic INTEGER, bmi REAL
-        )
-    """)
-    conn.commit()
-    conn.close()
+    patient_db.init_shard()
 
+# Writes go through patient_db (same patients.db as the default ward) so every
+# reading is folded into its patient's baseline, which hospital.py relies on.
+@metrics.timed("db.save_uploaded_data")
 def save_uploaded_data(df):
-    df["bmi"] = df.apply(lambda x: round(x["Weight"] / ((x["Height"]/100)**2), 2), axis=1)
-
-    df = df.rename(columns={
-        "Name": "name",
-        "Age": "age",
-        "Gender": "gender",
-        "Weight": "weight",
-        "Height": "height",
-        "Email": "email",
-        "HeartRate": "heart_rate",
-        "Temperature": "temperature",
-        "Oxygen": "oxygen",
-        "Systolic": "systolic",
-        "Diastolic": "diastolic"
-    })
-
-    conn = sqlite3.connect("patients.db")
-    df.to_sql("patients_data", conn, if_exists="append", index=False)
-    conn.close()
+    patient_db.insert_frame(patient_db.from_sheet(df))
 
+@metrics.timed("db.save_manual_patient")
 def save_manual_patient(patient):
     """Insert a manually entered patient record into DB."""
-    conn = sqlite3.connect("patients.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO patients_data 
-        (name, age, gender, weight, height, email, heart_rate, temperature, oxygen, systolic, diastolic, bmi)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        patient["name"], patient["age"], patient["gender"], patient["weight"], patient["height"],
-        patient["email"], patient["heart_rate"], patient["temperature"], patient["oxygen"],
-        patient["systolic"], patient["diastolic"], patient["bmi"]
-    ))
-    conn.commit()
-    conn.close()
+    patient_db.insert_patient(patient)
 
+@metrics.timed("db.get_patients")
 def get_patients():
     conn = sqlite3.connect("patients.db")
-    df = pd.read_sql("SELECT * FROM patients_data", conn)
+    df = pd.read_sql("SELECT rowid AS id, * FROM patients_data", conn)
     conn.close()
     return df
 
@@ -169,6 +193,7 @@ def get_risk_explanations(patient):
 # ---------------------------
 # PDF Report Generator
 # ---------------------------
+@metrics.timed("pdf.render")
 def generate_pdf_report(patient, risks):
     buffer = io.BytesIO()
     c = canvas.Canvas(buffer, pagesize=letter)
@@ -239,6 +264,12 @@ def patients_page():
         if st.button("🔑 Back to Login"):
             st.session_state.page = "login"
             st.rerun()
+    if st.button("📈 Metrics"):
+        st.session_state.page = "metrics"
+        st.rerun()
+    if st.button("🖥️ Wall Display"):
+        st.session_state.page = "grid"
+        st.rerun()
 
     st.subheader("📂 Upload Patient Data (Excel)")
     uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx", "xls"])
@@ -300,7 +331,6 @@ def patients_page():
 # Dashboard Page
 # ---------------------------
 def dashboard_page():
-    load_css()
     patient = st.session_state.selected_patient
 
     st.title("📊 Smartwatch Health Dashboard")
@@ -317,70 +347,9 @@ def dashboard_page():
 
     st.subheader(f"Patient: {patient['name']}")
 
-    # --- Metrics Cards (same as before) ---
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.markdown(f"""
-            <div class="card">
-                <h4>❤️ Heart Rate</h4>
-                <div class="metric-value">{patient['heart_rate']} BPM</div>
-                <div class="status {'normal' if 60 <= patient['heart_rate'] <= 100 else 'low'}">
-                    {'Normal' if 60 <= patient['heart_rate'] <= 100 else 'Alert'}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col2:
-        st.markdown(f"""
-            <div class="card">
-                <h4>👤 Patient Info</h4>
-                <p>{patient['name']}</p>
-                <p>Emergency: {patient['email']}</p>
-                <p>Age: {patient['age']} | Gender: {patient['gender']}</p>
-                <p>Weight: {patient['weight']} | Height: {patient['height']}</p>
-            </div>
-        """, unsafe_allow_html=True)
-    with col3:
-        st.markdown(f"""
-            <div class="card">
-                <h4>🌡️ Temperature</h4>
-                <div class="metric-value">{patient['temperature']}°C</div>
-                <div class="status {'good' if 36 <= patient['temperature'] <= 37.5 else 'low'}">
-                    {'Good' if 36 <= patient['temperature'] <= 37.5 else 'Alert'}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-
-    col4, col5, col6 = st.columns(3)
-    with col4:
-        st.markdown(f"""
-            <div class="card">
-                <h4>BMI</h4>
-                <div class="metric-value">{round(patient['bmi'], 2)}</div>
-                <div class="status {'normal' if 18.5 <= patient['bmi'] <= 24.9 else 'low'}">
-                    {'Normal' if 18.5 <= patient['bmi'] <= 24.9 else 'Alert'}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col5:
-        st.markdown(f"""
-            <div class="card">
-                <h4>🩸 Blood Pressure</h4>
-                <div class="metric-value">{patient['systolic']}/{patient['diastolic']}</div>
-                <div class="status {'normal' if patient['systolic']<140 and patient['diastolic']<90 else 'low'}">
-                    {'Normal' if patient['systolic']<140 and patient['diastolic']<90 else 'Alert'}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col6:
-        st.markdown(f"""
-            <div class="card">
-                <h4>Oxygen Level</h4>
-                <div class="metric-value">{patient['oxygen']}%</div>
-                <div class="status {'normal' if patient['oxygen']>=95 else 'low'}">
-                    {'Normal' if patient['oxygen']>=95 else 'Low'}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+    # --- Metrics Cards (prebuilt per patient version, one markdown call) ---
+    with metrics.timer("render.dashboard_cards"):
+        st.markdown(DASHBOARD_CSS + patient_cards(patient), unsafe_allow_html=True)
 
     # --- Risk Analysis ---
     st.subheader("📝 Detailed Risk Analysis")
@@ -401,6 +370,43 @@ def dashboard_page():
         mime="application/pdf"
     )
 
+# ---------------------------
+# Wall Display (multi-patient grid)
+# ---------------------------
+def grid_page():
+    if st.button("🔙 Return to Patients"):
+        st.session_state.page = "patients"
+        st.rerun()
+
+    st.title("🖥️ Ward Wall Display")
+    try:
+        df = get_patients()
+    except Exception:
+        st.info("ℹ️ No patient data found. Please upload an Excel file or add manually.")
+        return
+    if df.empty:
+        st.info("ℹ️ No patient data found. Please upload an Excel file or add manually.")
+        return
+
+    limit = st.number_input("Patients shown (latest first)", min_value=1, max_value=len(df),
+                            value=min(24, len(df)))
+    blocks = []
+    with metrics.timer("render.grid_cards"):
+        for patient in df.tail(int(limit)).iloc[::-1].to_dict("records"):
+            blocks.append(f'<h4 class="block-title">👤 {_escape(patient["name"])}</h4>'
+                          f'{patient_cards(patient)}')
+        # All patients in one markdown call, so the browser gets a single element per rerun
+        st.markdown(f'{DASHBOARD_CSS}<div class="wall">{"".join(blocks)}</div>', unsafe_allow_html=True)
+
+# ---------------------------
+# Metrics Page
+# ---------------------------
+def admin_metrics_page():
+    if st.button("🔙 Return to Patients"):
+        st.session_state.page = "patients"
+        st.rerun()
+    metrics.metrics_page()
+
 # ---------------------------
 # Main Router
 # ---------------------------
@@ -412,3 +418,7 @@ elif st.session_state.page == "patients":
     patients_page()
 elif st.session_state.page == "dashboard":
     dashboard_page()
+elif st.session_state.page == "metrics":
+    admin_metrics_page()
+elif st.session_state.page == "grid":
+    grid_page()
@@ -3,6 +3,8 @@ import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 import joblib
 
+import drift_monitor
+
 # ----------------------------
 # 1. Create dummy training data
 # ----------------------------
@@ -38,3 +40,9 @@ model.fit(X, y)
 # ----------------------------
 joblib.dump(model, "risk_model.pkl")
 print("✅ Risk prediction model trained and saved as risk_model.pkl")
+
+# ----------------------------
+# 5. Save training distribution (drift reference)
+# ----------------------------
+drift_monitor.save_reference(X.values.tolist(), y.tolist())
+print(f"✅ Drift reference saved as {drift_monitor.REFERENCE_PATH}")
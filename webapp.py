@@ -5,14 +5,18 @@ from dotenv import load_dotenv
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from streamlit_autorefresh import st_autorefresh   # ✅ auto-refresh
+import chat_log
+import metrics
+import slack_broadcast
 
 # --- Load secrets from .env ---
 load_dotenv()
 SLACK_BOT_TOKEN   = os.getenv("SLACK_BOT_TOKEN", "").strip()
 SLACK_CHANNEL_ID  = os.getenv("SLACK_CHANNEL_ID", "").strip()
+SLACK_API_URL     = os.getenv("SLACK_API_URL", "https://slack.com/api/")  # override to point at a local mock
 
 # Slack client
-slack_client = WebClient(token=SLACK_BOT_TOKEN) if SLACK_BOT_TOKEN else None
+slack_client = WebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_URL) if SLACK_BOT_TOKEN else None
 
 st.set_page_config(page_title="Teams-like Messaging App", layout="wide")
 st.title("💬 Teams-like Messaging App")
@@ -20,9 +24,22 @@ st.title("💬 Teams-like Messaging App")
 # Auto-refresh every 5s
 st_autorefresh(interval=5000, limit=None, key="slack_refresher")
 
+# ---------------- Message log ----------------
+@st.cache_resource(on_release=lambda log: log.close())   # a cleared cache must free the log's lock
+def get_chat_log():
+    """Durable log shared by all sessions; replays the latest snapshot plus its tail once per process"""
+    return chat_log.ChatLog()
+
+def record_message(chat, payload):
+    """Add a message to this session's history and append it to the durable log"""
+    st.session_state.chat_history.setdefault(chat, []).append(payload)
+    get_chat_log().append(chat, payload)
+
 # ---------------- Session state ----------------
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = {}
+    st.session_state.chat_history = get_chat_log().state()
+if "last_broadcast" not in st.session_state:
+    st.session_state.last_broadcast = None
 
 # ---------------- Sidebar ----------------
 st.sidebar.title("Chats")
@@ -32,18 +49,25 @@ if not recipient_list:
     st.sidebar.markdown("_No conversations yet_")
 
 # ---------------- Helper: Slack sender ----------------
+def count_rate_limit(error):
+    """Record Slack tier rate-limit responses (HTTP 429) for the metrics page"""
+    if error.response.status_code == 429:
+        metrics.incr("slack.rate_limited")
+
 def send_to_slack_channel(sender_name, message_text):
     """Send message into Slack channel via bot token"""
     if not slack_client or not SLACK_CHANNEL_ID:
         return False, "Slack client not configured."
 
     try:
-        slack_client.chat_postMessage(
-            channel=SLACK_CHANNEL_ID,
-            text=f"*{sender_name}*: {message_text}"
-        )
+        with metrics.timer("slack.chat_postMessage"):
+            slack_client.chat_postMessage(
+                channel=SLACK_CHANNEL_ID,
+                text=f"*{sender_name}*: {message_text}"
+            )
         return True, "ok"
     except SlackApiError as e:
+        count_rate_limit(e)
         return False, e.response["error"]
 
 def send_to_slack_user(user_email, sender_name, message_text):
@@ -51,23 +75,16 @@ def send_to_slack_user(user_email, sender_name, message_text):
     if not slack_client:
         return False, "Slack client not configured."
 
-    try:
-        # 1. Find user ID from email
-        resp = slack_client.users_lookupByEmail(email=user_email)
-        user_id = resp["user"]["id"]
-
-        # 2. Open a DM channel with the user
-        im = slack_client.conversations_open(users=user_id)
-        dm_channel_id = im["channel"]["id"]
-
-        # 3. Send message into the DM
-        slack_client.chat_postMessage(
-            channel=dm_channel_id,
-            text=f"*{sender_name}*: {message_text}"
-        )
-        return True, "ok"
-    except SlackApiError as e:
-        return False, e.response["error"]
+    # Lookup + DM channel are cached per email, so repeat recipients cost one call
+    result = slack_broadcast.send_dm(slack_client, user_email, f"*{sender_name}*: {message_text}")
+    return result["ok"], result["info"]
+
+def broadcast_to_slack_users(user_emails, sender_name, message_text):
+    """Send the same DM to many Slack users concurrently; one result dict per recipient"""
+    if not slack_client:
+        return [{"email": e, "ok": False, "info": "Slack client not configured.", "ts": None}
+                for e in user_emails]
+    return slack_broadcast.broadcast(slack_client, user_emails, f"*{sender_name}*: {message_text}")
 
 # ---------------- Helper: Slack fetcher ----------------
 def get_slack_username(user_id):
@@ -75,7 +92,8 @@ def get_slack_username(user_id):
     try:
         if not slack_client:
             return "Unknown"
-        resp = slack_client.users_info(user=user_id)
+        with metrics.timer("slack.users_info"):
+            resp = slack_client.users_info(user=user_id)
         return resp["user"]["profile"].get("real_name", "Unknown")
     except Exception:
         return "Unknown"
@@ -86,7 +104,8 @@ def fetch_from_slack():
         return []
 
     try:
-        response = slack_client.conversations_history(channel=SLACK_CHANNEL_ID, limit=10)
+        with metrics.timer("slack.conversations_history"):
+            response = slack_client.conversations_history(channel=SLACK_CHANNEL_ID, limit=10)
         messages = []
         for msg in reversed(response.get("messages", [])):  # oldest first
             user_id = msg.get("user", None)
@@ -97,10 +116,12 @@ def fetch_from_slack():
                 "recipient": {"name": "You", "email": "local@app"},
                 "message": msg.get("text", ""),
                 "timestamp": datetime.datetime.fromtimestamp(float(msg["ts"])).strftime("%Y-%m-%d %H:%M:%S"),
-                "status": "📥 Received"
+                "status": "📥 Received",
+                "slack_ts": msg["ts"],
             })
         return messages
     except SlackApiError as e:
+        count_rate_limit(e)
         st.error(f"Slack fetch error: {e.response['error']}")
         return []
 
@@ -109,11 +130,16 @@ st.header("Compose Message")
 
 sender_name     = st.text_input("Your Name", value="")
 sender_email    = st.text_input("Your Email", value="")
-send_mode       = st.radio("Send To", ["Slack Channel", "Slack User (by email)"])
+send_mode       = st.radio("Send To", ["Slack Channel", "Slack User (by email)", "Slack Users (broadcast)"])
 recipient_email = None
+recipient_emails = []
 
 if send_mode == "Slack User (by email)":
     recipient_email = st.text_input("Recipient Slack Email", value="")
+elif send_mode == "Slack Users (broadcast)":
+    recipient_emails = slack_broadcast.parse_recipients(
+        st.text_area("Recipient Slack Emails (one per line or comma-separated)", height=100)
+    )
 else:
     recipient_email = "slack@channel"  # fixed for channel messages
 
@@ -121,7 +147,23 @@ message_text    = st.text_area("Type your message here...", height=120)
 sent = st.button("Send")
 
 # ---------------- Send handler ----------------
-if sent:
+if sent and send_mode == "Slack Users (broadcast)":
+    if not (sender_name and sender_email and message_text and recipient_emails):
+        st.error("Please fill in all fields.")
+    else:
+        results = broadcast_to_slack_users(recipient_emails, sender_name, message_text)
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for result in results:
+            record_message(result["email"], {
+                "sender": {"name": sender_name, "email": sender_email},
+                "recipient": {"name": send_mode, "email": result["email"]},
+                "message": message_text,
+                "timestamp": timestamp,
+                "status": "✅ Delivered" if result["ok"] else f"❌ Failed ({result['info']})"
+            })
+        st.session_state.last_broadcast = results
+        st.rerun()
+elif sent:
     if not (sender_name and sender_email and message_text):
         st.error("Please fill in all fields.")
     else:
@@ -132,7 +174,7 @@ if sent:
             "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "status": "✅ Delivered"
         }
-        st.session_state.chat_history.setdefault(recipient_email, []).append(payload)
+        record_message(recipient_email, payload)
 
         # Send to Slack
         if send_mode == "Slack Channel":
@@ -148,13 +190,26 @@ if sent:
         selected_recipient = recipient_email
         st.rerun()
 
+# ---------------- Broadcast results ----------------
+if st.session_state.last_broadcast:
+    results = st.session_state.last_broadcast
+    delivered = sum(r["ok"] for r in results)
+    if delivered == len(results):
+        st.success(f"Broadcast delivered to all {delivered} recipients!")
+    else:
+        st.warning(f"Broadcast delivered to {delivered} of {len(results)} recipients.")
+    with st.expander("Delivery results", expanded=delivered != len(results)):
+        st.dataframe(results)
+
 # ---------------- Slack sync (channel only for now) ----------------
 if SLACK_BOT_TOKEN and SLACK_CHANNEL_ID:
     slack_msgs = fetch_from_slack()
+    # Deduplicate against the shared log, not this session's copy: every open tab syncs
+    log = get_chat_log()
     for sm in slack_msgs:
-        st.session_state.chat_history.setdefault("slack@channel", [])
-        if sm not in st.session_state.chat_history["slack@channel"]:
-            st.session_state.chat_history["slack@channel"].append(sm)
+        log.append_if_absent("slack@channel", sm, key="slack_ts")
+    if slack_msgs:
+        st.session_state.chat_history["slack@channel"] = log.messages("slack@channel")
 
 # ---------------- Conversation view ----------------
 st.markdown("---")
@@ -191,3 +246,8 @@ if selected_recipient and selected_recipient in st.session_state.chat_history:
 else:
     st.subheader("Conversation")
     st.write("_No messages yet_")
+
+# ---------------- Metrics (admin) ----------------
+if st.sidebar.checkbox("📈 Show metrics"):
+    st.markdown("---")
+    metrics.metrics_page()